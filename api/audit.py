@@ -0,0 +1,210 @@
+"""Append-only audit log of authentication activity.
+
+Handlers call audit_log.record(), which only appends to an in-memory buffer.
+A background task writes the buffer out as NDJSON every AUDIT_FLUSH_INTERVAL
+seconds, or sooner once AUDIT_BATCH_SIZE events are waiting. Each write is
+one append per file. Events are never written to the database. A full
+buffer drops events rather than slow down a login.
+
+Files go to AUDIT_DIR, one per process and AUDIT_ROTATE_SECONDS window:
+audit-<window start, UTC>-<pid>.ndjson. Every line starts with the "ts" key,
+so the query CLI can skip whole files by name and mtime, and lines by
+timestamp, without parsing JSON:
+
+    python -m api.audit --since 2024-05-01T00:00 --until 2024-05-02T00:00 --event login_failed
+    python -m api.audit --since 2024-05-01 --format csv > failed_logins.csv
+"""
+import argparse
+import asyncio
+import csv
+import heapq
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import orjson
+
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() in ("1", "true", "yes")
+AUDIT_DIR = os.getenv("AUDIT_DIR", "logs/audit")
+AUDIT_BUFFER_MAX = int(os.getenv("AUDIT_BUFFER_MAX", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "1000"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+AUDIT_ROTATE_SECONDS = int(os.getenv("AUDIT_ROTATE_SECONDS", "3600"))
+
+FILE_PREFIX = "audit-"
+FILE_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+TS_PREFIX = b'{"ts":'
+# Every field record() is called with across main.py
+CSV_COLUMNS = ["ts", "event", "ip", "user_id", "username", "email", "detail"]
+
+
+class AuditLog:
+    def __init__(self, directory: str, max_buffered: int, batch_size: int, interval: float,
+                 rotate_seconds: int, enabled: bool = True):
+        self.directory = directory
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.interval = interval
+        self.rotate_seconds = rotate_seconds
+        self.enabled = enabled
+        self._buffer = []
+        self._wakeup = None
+        self._task = None
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(self, event: str, **fields) -> bool:
+        """Buffer one event. Returns False if it had to be dropped."""
+        if not self.enabled:
+            return False
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            return False
+        self._buffer.append({"ts": round(time.time(), 3), "event": event, **fields})
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _path(self, ts: float) -> str:
+        window = datetime.fromtimestamp(ts - ts % self.rotate_seconds, timezone.utc)
+        return os.path.join(self.directory, f"{FILE_PREFIX}{window.strftime(FILE_TIME_FORMAT)}-{os.getpid()}.ndjson")
+
+    def _write(self, events: list):
+        os.makedirs(self.directory, exist_ok=True)
+        lines = {}
+        for event in events:
+            lines.setdefault(self._path(event["ts"]), []).append(orjson.dumps(event))
+        for path, encoded in lines.items():
+            with open(path, "ab") as file:
+                file.write(b"\n".join(encoded) + b"\n")
+
+    async def flush(self):
+        events, self._buffer = self._buffer, []
+        if not events:
+            return
+        try:
+            await asyncio.to_thread(self._write, events)
+            self.written += len(events)
+        except Exception:
+            self.dropped += len(events)
+            logger.exception("Writing %d audit events failed", len(events))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+audit_log = AuditLog(AUDIT_DIR,
+                     max_buffered=AUDIT_BUFFER_MAX,
+                     batch_size=AUDIT_BATCH_SIZE,
+                     interval=AUDIT_FLUSH_INTERVAL,
+                     rotate_seconds=AUDIT_ROTATE_SECONDS,
+                     enabled=AUDIT_ENABLED)
+
+
+########## Query ##########
+
+def line_ts(line: bytes) -> float:
+    """Timestamp of an encoded event, read from the leading "ts" key."""
+    return float(line[len(TS_PREFIX):line.index(b",", len(TS_PREFIX))])
+
+
+def file_start(name: str) -> Optional[float]:
+    try:
+        stamp = name[len(FILE_PREFIX):].split("-", 1)[0]
+        return datetime.strptime(stamp, FILE_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def read_file(path: str, since: float, until: float) -> Iterator[tuple]:
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.startswith(TS_PREFIX):
+                continue
+            ts = line_ts(line)
+            if since <= ts < until:
+                yield ts, line.rstrip(b"\n")
+
+
+def scan(directory: str, since: float, until: float, events: Optional[set] = None) -> Iterator[bytes]:
+    """Encoded events with since <= ts < until, oldest first.
+
+    A file is opened only if its window starts before `until` and it was
+    last written after `since`. Each file is in time order, so the files
+    are merged rather than sorted.
+    """
+    paths = []
+    for entry in os.scandir(directory) if os.path.isdir(directory) else []:
+        start = file_start(entry.name) if entry.name.startswith(FILE_PREFIX) else None
+        if start is None or start >= until or entry.stat().st_mtime < since:
+            continue
+        paths.append(entry.path)
+
+    for _, line in heapq.merge(*(read_file(path, since, until) for path in sorted(paths)), key=lambda item: item[0]):
+        if events is None or orjson.loads(line)["event"] in events:
+            yield line
+
+
+def parse_time(value: str) -> float:
+    """ISO date or datetime, read as UTC unless it has an offset."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Query the audit log by time range.")
+    parser.add_argument("--dir", default=AUDIT_DIR)
+    parser.add_argument("--since", type=parse_time, default=0.0)
+    parser.add_argument("--until", type=parse_time, default=float("inf"))
+    parser.add_argument("--event", action="append", help="Only this event type, can be repeated.")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    args = parser.parse_args(argv)
+
+    lines = scan(args.dir, args.since, args.until, set(args.event) if args.event else None)
+    if args.format == "ndjson":
+        out = sys.stdout.buffer
+        for line in lines:
+            out.write(line + b"\n")
+        out.flush()
+        return
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for line in lines:
+        event = orjson.loads(line)
+        event["ts"] = datetime.fromtimestamp(event["ts"], timezone.utc).isoformat()
+        writer.writerow(event)
+
+
+if __name__ == "__main__":
+    main()
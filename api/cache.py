@@ -0,0 +1,189 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from api.shared import SQLiteSharedStore, shared_store
+from api.writer import WRITE_BATCH_INTERVAL, WRITE_BEHIND
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Upper bound on how long a worker trusts its local copy. With a shared backend
+# this is also how long another worker may keep serving a revoked token.
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "30"))
+NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "10000"))
+# Kept short: a row created where this worker cannot invalidate the entry
+# (another worker's write-behind buffer, login_db directly) is missed this long
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "10"))
+# With write-behind, a token just issued by another worker may still be in its
+# buffer, so a missed token lookup is only trusted until that buffer flushes
+MISSING_TOKEN_TTL = min(NEGATIVE_CACHE_TTL, WRITE_BATCH_INTERVAL) if WRITE_BEHIND else NEGATIVE_CACHE_TTL
+
+# Value stored in the negative cache
+MISSING = "missing"
+# Negative entries for emails are also published to the other workers; tokens never contain ':'
+EMAIL_KEY_PREFIX = "email:"
+
+
+def to_timestamp(value: datetime) -> float:
+    """Naive datetimes are UTC in this codebase (see datetime.utcnow() calls)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SharedBackend:
+    """Interface for a cache shared between workers (e.g. Redis or memcached)."""
+
+    def get(self, key: str) -> Optional[tuple]:
+        """(value, expires_at as a timestamp), or None."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, expires_at: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class SharedStoreBackend(SharedBackend):
+    """Shared backend on the SQLite file of api.shared, for the workers of one host.
+
+    Deleting an entry here does not reach the other workers' local copies;
+    that is the job of the invalidation log, which ends in invalidate() on
+    every worker's cache.
+    """
+
+    def __init__(self, store: SQLiteSharedStore):
+        self.store = store
+
+    def get(self, key: str) -> Optional[tuple]:
+        return self.store.cache_get(key)
+
+    def set(self, key: str, value: str, expires_at: float):
+        self.store.cache_set(key, value, expires_at)
+
+    def delete(self, key: str):
+        self.store.cache_delete(key)
+
+
+class TTLCache:
+    """Size-capped LRU cache whose entries expire at a per-entry deadline.
+
+    Entries are kept until min(now + ttl, expires_at), so a cached token status
+    never outlives the token itself. Lookups that miss locally fall back to the
+    optional shared backend before the caller goes to the database. Shared
+    entries carry the same deadline, so a copy taken from them is bounded by
+    the token's expiry too.
+    """
+
+    def __init__(self, max_size: int, ttl: float, shared: Optional[SharedBackend] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _shared_key(key: str) -> str:
+        # Tokens are long JWTs, keep shared keys short and fixed size
+        return "token:" + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, deadline = entry
+            if deadline > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.shared is not None:
+            item = self.shared.get(self._shared_key(key))
+            if item is not None:
+                value, expires_at = item
+                self.hits += 1
+                self._store(key, value, min(now + self.ttl, expires_at))
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, expires_at: Optional[datetime] = None):
+        now = time.time()
+        deadline = now + self.ttl
+        if expires_at is not None:
+            remaining = to_timestamp(expires_at) - now
+            if remaining <= 0:
+                return
+            deadline = min(deadline, now + remaining)
+            if self.shared is not None:
+                # Bounded by ttl too: a delete skipped by the fail-open store is stale only that long
+                self.shared.set(self._shared_key(key), value, deadline)
+        self._store(key, value, deadline)
+
+    def _store(self, key: str, value: str, deadline: float):
+        self._entries[key] = (value, deadline)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate(), 4),
+        }
+
+
+# With SHARED_STATE_PATH, a token validated by one worker is a hit in the others
+token_cache = TTLCache(max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL,
+                       shared=SharedStoreBackend(shared_store) if shared_store is not None else None)
+
+# Lookups known to find nothing, so repeated garbage tokens and unknown
+# emails stop reaching the database. Keys carry what was looked up, since
+# "no usable token" and "no usable reset token" are different answers.
+negative_cache = TTLCache(max_size=NEGATIVE_CACHE_SIZE, ttl=NEGATIVE_CACHE_TTL)
+
+
+def missing_token_key(token: str) -> str:
+    """No active, unexpired token with this value."""
+    return f"token:{token}"
+
+
+def missing_reset_key(token: str) -> str:
+    """No active, unexpired reset token with this value."""
+    return f"reset:{token}"
+
+
+def missing_email_key(email: str) -> str:
+    return f"{EMAIL_KEY_PREFIX}{email}"
+
+
+def remember_missing_token(key: str):
+    """Negative entry for a token or reset token lookup, kept MISSING_TOKEN_TTL."""
+    negative_cache.set(key, MISSING, expires_at=datetime.utcnow() + timedelta(seconds=MISSING_TOKEN_TTL))
@@ -0,0 +1,26 @@
+import os
+
+from api.exceptions import MissingEnvironmentVariableError
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+################# Constants & Environment Variables ###############
+# TODO: all the environment variables as strings??????
+ALGORITHM = os.getenv("ALGORITHM")
+ACCESS_TOKEN_EXPIRE_MINUTES = float(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+# Only for HS* algorithms; asymmetric ones read their keys in api.keys
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not all([ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES]) or (ALGORITHM.upper().startswith("HS") and not SECRET_KEY):
+    logger.critical("Missing environment variables.")
+    raise MissingEnvironmentVariableError("Missing environment variables.")
+
+# "database" checks every token against the Token table, "stateless" checks
+# signature and exp locally and only consults the in-memory revocation list.
+TOKEN_VALIDATION_MODE = os.getenv("TOKEN_VALIDATION_MODE", "database")
+
+# Shared secret for the bulk/admin endpoints (X-Admin-Key header). Unset disables them.
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+# Rows accepted by one /register/bulk/ request, inserted BULK_CHUNK_SIZE at a time
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "10000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
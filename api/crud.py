@@ -0,0 +1,204 @@
+# Async counterparts of login_db.functions.* for use with an AsyncSession.
+# Hashing goes through hash_executor so bcrypt never runs on the event loop.
+import asyncio
+import secrets
+from datetime import datetime
+
+from login_db.enums import TokenStatus, TokenType
+from login_db.models import Token, User
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.cache import missing_email_key, missing_reset_key, missing_token_key, negative_cache
+from api.keys import key_ring
+from api.metrics import timed
+from api.passwords import hash_password, verify_password
+from api.workers import hash_executor
+from api.writer import token_writer
+
+# INSERT ... ON CONFLICT DO NOTHING per dialect, PostgreSQL's for any other
+CONFLICT_INSERTS = {"sqlite": sqlite.insert}
+
+
+def insert_ignoring_conflicts(model, session: AsyncSession):
+    insert = CONFLICT_INSERTS.get(session.bind.dialect.name, postgresql.insert)
+    return insert(model).on_conflict_do_nothing()
+
+
+async def retrieve_user(username_or_email: str, session: AsyncSession):
+    return await session.scalar(
+        select(User).where(or_(User.username == username_or_email,
+                               User.email == username_or_email))
+    )
+
+
+async def authenticate_user(username: str, password: str, session: AsyncSession, check=None):
+    """Return the user if the password matches, otherwise None.
+
+    Loads the row once and reuses it for the status checks done by the caller.
+    `check(user)` runs on the row before the password is verified and may
+    raise to refuse the attempt without paying for the hash.
+    """
+    user = await retrieve_user(username_or_email=username, session=session)
+    if user is None:
+        return None
+    if check is not None:
+        check(user)
+    if not await hash_executor.run(verify_password, password, user.password):
+        return None
+    return user
+
+
+async def insert_user(userdata: dict, session: AsyncSession):
+    userdata = dict(userdata)
+    userdata["password"] = await hash_executor.run(hash_password, userdata["password"])
+    session.add(User(**userdata))
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise
+    negative_cache.invalidate(missing_email_key(userdata["email"]))
+
+
+async def hash_passwords(passwords: list) -> list:
+    """Hash in parallel, keeping at most one pool's worth of calls in flight
+    so a large batch does not fill the queue that single requests share."""
+    hashed = []
+    step = hash_executor.max_workers
+    for start in range(0, len(passwords), step):
+        hashed.extend(await asyncio.gather(*(hash_executor.run(hash_password, password)
+                                             for password in passwords[start:start + step])))
+    return hashed
+
+
+async def insert_users(rows: list, session: AsyncSession) -> dict:
+    """Insert many users with one multi-row INSERT and commit.
+
+    Returns {row index: error} for rows that were not inserted. Rows clashing
+    with existing users are found up front so their passwords are never
+    hashed; ON CONFLICT DO NOTHING catches the ones inserted concurrently.
+    """
+    errors = {}
+    existing = await session.execute(select(User.username, User.email).where(
+        or_(User.username.in_([row["username"] for row in rows]),
+            User.email.in_([row["email"] for row in rows]))
+    ))
+    usernames, emails = set(), set()
+    for username, email in existing:
+        usernames.add(username)
+        emails.add(email)
+
+    fresh = []
+    for index, row in enumerate(rows):
+        if row["username"] in usernames or row["email"] in emails:
+            errors[index] = "Username or email already exists."
+            continue
+        usernames.add(row["username"])
+        emails.add(row["email"])
+        fresh.append((index, dict(row)))
+    if not fresh:
+        return errors
+
+    hashed = await hash_passwords([row["password"] for _, row in fresh])
+    for (_, row), password in zip(fresh, hashed):
+        row["password"] = password
+    inserted = set(await session.scalars(
+        insert_ignoring_conflicts(User, session).values([row for _, row in fresh]).returning(User.username)
+    ))
+    await session.commit()
+    for index, row in fresh:
+        if row["username"] not in inserted:
+            errors[index] = "Username or email already exists."
+        else:
+            negative_cache.invalidate(missing_email_key(row["email"]))
+    return errors
+
+
+async def modify_user_password(user_id: int, password: str, session: AsyncSession):
+    """Stage a password change. The caller commits."""
+    hashed_password = await hash_executor.run(hash_password, password)
+    await session.execute(update(User).where(User.id == user_id).values(password=hashed_password))
+
+
+async def rehash_password(user_id: int, old_hash: str, password: str, session: AsyncSession) -> bool:
+    """Replace a stale hash with one at the current scheme and cost.
+
+    Only writes if the stored hash is still `old_hash`, so a password reset
+    that lands in between is never overwritten. Returns True if it wrote.
+    """
+    new_hash = await hash_executor.run(hash_password, password)
+    result = await session.execute(update(User)
+                                   .where(User.id == user_id, User.password == old_hash)
+                                   .values(password=new_hash))
+    await session.commit()
+    return result.rowcount == 1
+
+
+async def insert_token(user_id: int,
+                       token: str,
+                       type: TokenType,
+                       status: TokenStatus,
+                       expiration_time: datetime,
+                       session: AsyncSession):
+    negative_cache.invalidate(missing_token_key(token))
+    negative_cache.invalidate(missing_reset_key(token))
+    if token_writer.running:
+        token_writer.insert({"user_id": user_id,
+                             "token": token,
+                             "type": type,
+                             "status": status,
+                             "expiration_time": expiration_time})
+        return
+    session.add(Token(user_id=user_id,
+                      token=token,
+                      type=type,
+                      status=status,
+                      expiration_time=expiration_time))
+    await session.commit()
+
+
+async def create_jwt_token(data: dict, session: AsyncSession) -> str:
+    # jose converts datetime claims in place, keep the caller's exp a datetime.
+    # jti keeps two logins of one user within the same second from producing
+    # the same token, which the unique Token.token column would reject.
+    claims = {**data, "jti": secrets.token_urlsafe(8)}
+    with timed("jwt_encode"):
+        token = key_ring.encode(claims)
+    await insert_token(user_id=int(data["sub"]),
+                       token=token,
+                       type=TokenType.ACCESS,
+                       status=TokenStatus.ACTIVE,
+                       expiration_time=data["exp"],
+                       session=session)
+    return token
+
+
+async def set_token_status(token: Token, status: TokenStatus, session: AsyncSession):
+    if token_writer.running:
+        token_writer.update_status(token.token, status)
+        return
+    token.status = status
+    await session.commit()
+
+
+async def revoke_user_tokens(user_ids: list, status: TokenStatus, session: AsyncSession) -> list:
+    """Set every active token of the given users to `status` in one UPDATE and commit.
+
+    Returns (token, type, expiration_time) for each revoked row so the caller
+    can drop them from the caches.
+    """
+    if token_writer.running:
+        # Buffered tokens must be in the table for the UPDATE to see them
+        await token_writer.flush()
+    result = await session.execute(
+        update(Token)
+        .where(Token.user_id.in_(user_ids), Token.status == TokenStatus.ACTIVE)
+        .values(status=status)
+        .returning(Token.token, Token.type, Token.expiration_time)
+    )
+    revoked = result.all()
+    await session.commit()
+    return revoked
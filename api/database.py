@@ -0,0 +1,59 @@
+import os
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Seconds a request waits for a free connection before it gets a 503. Short on
+# purpose: a saturated pool should shed load, not queue it behind a 30s stall.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "2"))
+# Connections older than this are replaced, before server or proxy idle limits close them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# SQLAlchemy's compiled statement cache, per engine
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# psycopg prepares a statement server-side after this many executions. Empty
+# keeps the driver default; "none" disables it, as PgBouncer transaction pooling requires.
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD")
+
+
+def get_database_url():
+    # DATABASE_URL wins, e.g. sqlite+aiosqlite:///bench.db for a local benchmark run
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+    # Same variables the Makefile passes to the API container
+    port = os.getenv("POSTGRES_PORT")
+    return URL.create("postgresql+psycopg",
+                      username=os.getenv("POSTGRES_USER"),
+                      password=os.getenv("POSTGRES_PASSWORD"),
+                      host=os.getenv("POSTGRES_HOST"),
+                      port=int(port) if port else None,
+                      database=os.getenv("POSTGRES_DB"))
+
+
+def get_pool_options(url) -> dict:
+    options = {"query_cache_size": DB_QUERY_CACHE_SIZE}
+    # aiosqlite (benchmarks only) uses a NullPool and rejects the sizing arguments
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    options.update({"pool_size": DB_POOL_SIZE,
+                    "max_overflow": DB_MAX_OVERFLOW,
+                    "pool_timeout": DB_POOL_TIMEOUT,
+                    "pool_recycle": DB_POOL_RECYCLE,
+                    "pool_pre_ping": DB_POOL_PRE_PING})
+    if DB_PREPARE_THRESHOLD:
+        threshold = None if DB_PREPARE_THRESHOLD.lower() == "none" else int(DB_PREPARE_THRESHOLD)
+        options["connect_args"] = {"prepare_threshold": threshold}
+    return options
+
+
+engine = create_async_engine(get_database_url(), **get_pool_options(get_database_url()))
+
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def get_session():
+    """FastAPI dependency yielding an AsyncSession that is closed after the request."""
+    async with AsyncSessionLocal() as session:
+        yield session
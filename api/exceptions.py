@@ -6,3 +6,17 @@ class MissingEnvironmentVariableError(Exception):
     """Exception raised when an environment variable is missing."""
     pass
 
+class OverloadedError(Exception):
+    """Exception raised when a bounded worker pool cannot accept more work."""
+    pass
+
+class SharedStateUnavailableError(Exception):
+    """Exception raised when the shared state file stays locked past its busy timeout."""
+    pass
+
+class RateLimitedError(Exception):
+    """Exception raised when a client exceeds a rate limit or is locked out."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:.0f}s.")
+        self.retry_after = retry_after
@@ -0,0 +1,43 @@
+"""Generate a JWT signing key for api.keys, named after its kid.
+
+    ALGORITHM=ES256 python -m api.keygen --dir keys
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+CURVES = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}
+
+
+def generate_private_key(algorithm: str) -> bytes:
+    """PEM private key for an ES* or RS* algorithm."""
+    if algorithm in CURVES:
+        private_key = ec.generate_private_key(CURVES[algorithm]())
+    elif algorithm.startswith(("RS", "PS")):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError(f"Cannot generate keys for {algorithm}.")
+    return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption())
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key named after its kid.")
+    parser.add_argument("--dir", default=os.getenv("JWT_KEYS_DIR", "keys"))
+    parser.add_argument("--algorithm", default=os.getenv("ALGORITHM", "ES256"))
+    parser.add_argument("--kid", default=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"))
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    path = os.path.join(args.dir, f"{args.kid}.pem")
+    # Private key: readable by the owner only
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as file:
+        file.write(generate_private_key(args.algorithm))
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
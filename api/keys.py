@@ -0,0 +1,103 @@
+"""JWT signing and verification keys.
+
+With an HS* ALGORITHM tokens are signed with SECRET_KEY, as before. With an
+asymmetric one (ES256, RS256, ...) every `<kid>.pem` private key in
+JWT_KEYS_DIR is loaded at startup: JWT_ACTIVE_KID signs new tokens (its kid
+goes in the token header) and all of them verify. Their public halves are
+served on /.well-known/jwks.json so other services can verify tokens
+themselves instead of calling /validate-token/.
+
+Rotation: generate a key, deploy so it is published but not used yet, give
+consumers time to refetch the JWKS, switch JWT_ACTIVE_KID to it, and delete
+the old file once ACCESS_TOKEN_EXPIRE_MINUTES have passed.
+
+    python -m api.keygen --dir keys      # writes keys/<kid>.pem
+
+Keys are built once into jose Key objects, so encode and decode never parse
+a key per call.
+"""
+import os
+from typing import Optional
+
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+
+from api.config import ALGORITHM, SECRET_KEY
+from api.exceptions import MissingEnvironmentVariableError
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+# Required once JWT_KEYS_DIR holds more than one key
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+
+
+def is_symmetric(algorithm: str) -> bool:
+    return algorithm.upper().startswith("HS")
+
+
+class KeyRing:
+    def __init__(self, algorithm: str, signing_key: Key, signing_kid: Optional[str] = None,
+                 verify_keys: Optional[dict] = None):
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.signing_kid = signing_kid
+        # kid -> Key; empty for a shared secret
+        self.verify_keys = verify_keys or {}
+        self._headers = {"kid": signing_kid} if signing_kid else None
+
+    def encode(self, claims: dict) -> str:
+        return jwt.encode(claims, self.signing_key, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        """Verified claims of `token`. Raises JWTError like jwt.decode."""
+        key = self.signing_key
+        if self.verify_keys:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = self.verify_keys.get(kid)
+            if key is None:
+                raise JWTError("Unknown key id.")
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+    def jwks(self) -> dict:
+        """Public keys as a JWK Set. Empty for a shared secret, which must never be published."""
+        keys = []
+        for kid, key in self.verify_keys.items():
+            public = key.to_dict()
+            public.update({"kid": kid, "use": "sig", "alg": self.algorithm})
+            keys.append(public)
+        return {"keys": keys}
+
+
+def load_key_ring(algorithm: str = ALGORITHM, directory: str = JWT_KEYS_DIR,
+                  active_kid: Optional[str] = JWT_ACTIVE_KID, secret: Optional[str] = SECRET_KEY) -> KeyRing:
+    if is_symmetric(algorithm):
+        if not secret:
+            raise MissingEnvironmentVariableError(f"SECRET_KEY is required for {algorithm}.")
+        return KeyRing(algorithm, jwk.construct(secret, algorithm))
+
+    paths = {}
+    if os.path.isdir(directory):
+        paths = {name[:-len(".pem")]: os.path.join(directory, name)
+                 for name in os.listdir(directory) if name.endswith(".pem")}
+    if not paths:
+        raise MissingEnvironmentVariableError(f"{algorithm} needs private keys in JWT_KEYS_DIR ({directory}).")
+    if active_kid is None and len(paths) == 1:
+        active_kid = next(iter(paths))
+    if active_kid not in paths:
+        # A new key must not sign before consumers have seen it, so never pick one implicitly
+        raise MissingEnvironmentVariableError(f"JWT_ACTIVE_KID must name one of the keys in {directory}.")
+
+    keys = {}
+    for kid, path in paths.items():
+        with open(path) as file:
+            keys[kid] = jwk.construct(file.read(), algorithm)
+    logger.info("Signing %s tokens with key %s, verifying %d keys", algorithm, active_kid, len(keys))
+    # Verification only needs the public half
+    return KeyRing(algorithm, keys[active_kid], active_kid,
+                   {kid: key.public_key() for kid, key in keys.items()})
+
+
+key_ring = load_key_ring()
+
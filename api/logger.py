@@ -1,26 +1,135 @@
 # logging.py
+import atexit
+import json
 import logging
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def get_logger(logger_name: str):
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "logs/application.log")
+# One file per process, <LOG_FILE stem>-<pid><ext>. api.server sets it for its
+# workers, which would otherwise rotate the same file independently.
+LOG_FILE_PER_PROCESS = os.getenv("LOG_FILE_PER_PROCESS", "false").lower() in ("1", "true", "yes")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of DEBUG records that are kept, the rest are dropped before queueing
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Keeps roughly `rate` of DEBUG records and every record above DEBUG."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args into the message here, keep `extra` fields for the JSON formatter
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def log_file_path(path: str = LOG_FILE, per_process: bool = LOG_FILE_PER_PROCESS) -> str:
+    if not per_process:
+        return path
+    stem, extension = os.path.splitext(path)
+    return f"{stem}-{os.getpid()}{extension}"
+
+
+def setup_logging() -> QueueListener:
+    """Route the root logger through a bounded queue to a background writer thread.
+
+    Request handlers only pay for building the record and a put_nowait; the
+    JSON formatting, rotation and disk/console I/O happen on the listener thread.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    path = log_file_path()
     # Create logs directory if it doesn't exist
-    os.makedirs("logs", exist_ok=True)
-
-    # Set up basic configuration for logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s | %(name)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        handlers=[
-            logging.FileHandler("logs/application.log"),
-            logging.StreamHandler()  # To output to the console as well
-        ]
-    )
-    return logging.getLogger(logger_name) 
-
-    # If needed, you can set up more specific loggers here
-    # For example, a logger for database-related logs:
-    # db_logger = logging.getLogger('db')
-    # db_logger.setLevel(logging.DEBUG)
-    # db_file_handler = logging.FileHandler('logs/db.log')
-    # db_logger.addHandler(db_file_handler)
\ No newline at end of file
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    formatter = JsonFormatter()
+    file_handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()  # To output to the console as well
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+
+def get_logger(logger_name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(logger_name)
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import smtplib
+from collections import deque
+from email.message import EmailMessage
+
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+MAIL_FROM = os.getenv("MAIL_FROM", "no-reply@localhost")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "5"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "1"))
+
+
+def build_message(to: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+class MailDeliveryError(Exception):
+    """Raised by a transport that delivered only part of a batch. `failed` are the messages that did not go out."""
+
+    def __init__(self, failed: list, cause: Exception):
+        super().__init__(f"{len(failed)} emails not delivered: {cause}")
+        self.failed = failed
+
+
+class SMTPTransport:
+    """Sends a batch of messages over a single SMTP connection.
+
+    A message the server refuses does not stop the rest of the batch. Any
+    failure after the first delivery raises MailDeliveryError with only the
+    undelivered messages, so a retry never sends an email twice.
+    """
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None, starttls: bool = True):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def send(self, messages: list):
+        failed = []
+        error = None
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for position, message in enumerate(messages):
+                try:
+                    smtp.send_message(message)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                    # Refused by the server, the connection is still usable
+                    failed.append(message)
+                    error = e
+                except (smtplib.SMTPException, OSError) as e:
+                    # Connection lost: this message and the rest did not go out
+                    raise MailDeliveryError(failed + messages[position:], e) from e
+        if failed:
+            raise MailDeliveryError(failed, error)
+
+
+class FakeSMTPSink:
+    """Keeps the last `maxlen` messages in memory. Used in tests and when no SMTP_HOST is set."""
+
+    def __init__(self, maxlen: int = 1000):
+        self.outbox = deque(maxlen=maxlen)
+        self.batches = 0
+
+    def send(self, messages: list):
+        self.outbox.extend(messages)
+        self.batches += 1
+
+
+class MailQueue:
+    """Bounded queue of outgoing emails drained by a pool of worker tasks.
+
+    Each worker takes up to `batch_size` waiting messages and hands them to the
+    transport in one call, retrying with exponential backoff. The transport is
+    blocking (smtplib), so it runs in a thread.
+    """
+
+    def __init__(self, transport, workers: int, queue_size: int, batch_size: int,
+                 max_retries: int, backoff: float):
+        self.transport = transport
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = None
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, message: EmailMessage) -> bool:
+        """Queue a message without waiting. Returns False if it had to be dropped."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error("Mail queue full, dropping message to %s", message["To"])
+            return False
+        return True
+
+    async def _send_with_retry(self, batch: list):
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self.transport.send, pending)
+                self.sent += len(pending)
+                return
+            except Exception as e:
+                # Only what did not go out is retried, nobody gets the same email twice
+                failed = e.failed if isinstance(e, MailDeliveryError) else pending
+                self.sent += len(pending) - len(failed)
+                pending = failed
+                if attempt == self.max_retries:
+                    self.failed += len(pending)
+                    logger.error("Giving up on %d emails: %s", len(pending), e)
+                    return
+                logger.warning("Sending %d emails failed (attempt %d): %s", len(pending), attempt + 1, e)
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._send_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """Give queued messages up to `timeout` seconds to go out, then stop the workers."""
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+if SMTP_HOST:
+    mail_transport = SMTPTransport(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS)
+else:
+    mail_transport = FakeSMTPSink()
+
+mail_queue = MailQueue(mail_transport,
+                       workers=MAIL_WORKERS,
+                       queue_size=MAIL_QUEUE_SIZE,
+                       batch_size=MAIL_BATCH_SIZE,
+                       max_retries=MAIL_MAX_RETRIES,
+                       backoff=MAIL_RETRY_BACKOFF)
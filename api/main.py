@@ -1,54 +1,141 @@
-import os
+import asyncio
+import json
+import math
 import secrets
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 
 from login_db.enums import TokenStatus, TokenType, UserStatus
-from login_db.connection import Session
-from login_db.functions.token import create_jwt_token, insert_token
-from login_db.functions.user import (
+from login_db.models import Token, User
+from login_db.exceptions import DatabaseInsertionError
+from api.audit import audit_log
+from api.cache import (
+    EMAIL_KEY_PREFIX,
+    MISSING,
+    NEGATIVE_CACHE_TTL,
+    missing_email_key,
+    missing_reset_key,
+    missing_token_key,
+    negative_cache,
+    remember_missing_token,
+    to_timestamp,
+    token_cache,
+)
+from api.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ADMIN_API_KEY,
+    BULK_CHUNK_SIZE,
+    BULK_MAX_ROWS,
+    TOKEN_VALIDATION_MODE,
+)
+from api.crud import (
+    authenticate_user,
+    create_jwt_token,
+    insert_token,
     insert_user,
-    is_username_password_valid,
+    insert_users,
     modify_user_password,
-    retrieve_user,
+    rehash_password,
+    revoke_user_tokens,
+    set_token_status,
 )
-from login_db.models import Token, User
-from login_db.exceptions import DatabaseInsertionError, MissingEnvironmentVariableError
-#from api.logger import get_logger
-from fastapi import Depends, FastAPI, HTTPException
+from api.database import DB_MAX_OVERFLOW, AsyncSessionLocal, engine, get_session
+from api.exceptions import OverloadedError, RateLimitedError
+from api.keys import key_ring
+from api.mailer import build_message, mail_queue
+from api.passwords import configure_cost, needs_rehash
+from api.querystats import QUERY_BUDGETS
+from api.principals import USER_KEY_PREFIX, Principal, invalidate_user, load_principal, user_cache, user_key
+from api.models import ensure_tables
+from api.metrics import (
+    DB_POOL_TIMEOUTS,
+    CallbackMetric,
+    MetricsMiddleware,
+    instrument_engine,
+    instrument_pool,
+    instrument_sessions,
+    registry,
+    timed,
+)
+from api.ratelimit import (
+    forgotten_email_limiter,
+    forgotten_ip_limiter,
+    login_ip_limiter,
+    login_throttle,
+    rate_limit_store,
+)
+from api.reaper import REAPER_ENABLED, run_reaper
+from api.refresh import issue_refresh_token, revoke_user_refresh_tokens, rotate_refresh_token
+from api.responses import JSONResponse, PreEncodedJSONResponse, encode
+from api.revocation import (
+    is_jwt,
+    refresh_revocations,
+    revocation_list,
+    run_revocation_refresher,
+    verify_access_token,
+)
+from api.logger import get_logger
+from api.shared import run_shared_sync, shared_store
+from api.warmup import WARMUP_TIMEOUT_SECONDS, readiness, run_warmup
+from api.workers import hash_executor
+from api.writer import WRITE_BEHIND, token_writer
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from pydantic import BaseModel, EmailStr
+import orjson
+from jose import JWTError
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import or_, select, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 ########################## Logging ##########################
 # Initialize logger
-#logger = get_logger(__name__)
-#logger.info("Starting FastAPI server...")
-
-################# Constants & Environment Variables ###############
-# TODO: all the environment variables as strings??????
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = float(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-SECRET_KEY = os.getenv("SECRET_KEY")
-if not all([ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY]):
-    #logger.critical("Missing environment variables.")
-    raise MissingEnvironmentVariableError("Missing environment variables.")
+logger = get_logger(__name__)
+logger.info("Starting FastAPI server...")
 
 ########################## FastAPI ##########################
 # Define a lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # On startup
-    pass
+    configure_cost()
+    mail_queue.start()
+    audit_log.start()
+    await ensure_tables(engine)
+    background_tasks = []
+    if TOKEN_VALIDATION_MODE == "stateless":
+        await refresh_revocations(AsyncSessionLocal)
+        background_tasks.append(asyncio.create_task(run_revocation_refresher(AsyncSessionLocal)))
+    if WRITE_BEHIND:
+        token_writer.start()
+    if REAPER_ENABLED:
+        background_tasks.append(asyncio.create_task(run_reaper(AsyncSessionLocal)))
+    if shared_store is not None:
+        background_tasks.append(asyncio.create_task(run_shared_sync(shared_store, apply_invalidation)))
+    warmup_task = asyncio.create_task(run_warmup(engine))
+    done, _ = await asyncio.wait({warmup_task}, timeout=WARMUP_TIMEOUT_SECONDS)
+    if not done:
+        logger.warning("Warm-up not finished after %.0fs, serving as not ready", WARMUP_TIMEOUT_SECONDS)
+        background_tasks.append(warmup_task)
     yield
     # On shutdown
-    pass
+    readiness.ready = False
+    for task in background_tasks:
+        task.cancel()
+    await token_writer.stop()
+    await mail_queue.stop()
+    await audit_log.stop()
+    logger.info("Shutting down FastAPI server...")
+    hash_executor.shutdown(wait=True)
+    await engine.dispose()
 
 # Initialize FastAPI app
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
 
 # Define a list of origins that should be allowed to make requests
 origins = [
@@ -64,6 +151,35 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+app.add_middleware(MetricsMiddleware)
+
+def client_ip(request: Request) -> str:
+    # Already the X-Forwarded-For address when the peer is in TRUSTED_PROXIES (see api.server)
+    return request.client.host if request.client else "unknown"
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    logger.warning("Rejecting %s: %s", request.url.path, exc)
+    return JSONResponse(content={"detail": "Server overloaded, try again later."},
+                        status_code=503,
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # Every connection stayed busy for DB_POOL_TIMEOUT: shed the request instead of queueing it
+    DB_POOL_TIMEOUTS.inc()
+    logger.warning("Rejecting %s: connection pool exhausted", request.url.path)
+    return JSONResponse(content={"detail": "Server overloaded, try again later."},
+                        status_code=503,
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited_handler(request: Request, exc: RateLimitedError):
+    logger.info("Rate limited %s from %s", request.url.path, client_ip(request))
+    return JSONResponse(content={"detail": "Too many requests, try again later."},
+                        status_code=429,
+                        headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
 
 ########################### Authentication ###########################
 
@@ -71,35 +187,86 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
+async def rehash_user_password(user_id: int, old_hash: str, password: str):
+    """Runs after the login response is sent, so the extra hash never adds to login latency."""
+    try:
+        async with AsyncSessionLocal() as session:
+            if await rehash_password(user_id, old_hash, password, session=session):
+                logger.info("Rehashed password of user %s", user_id)
+    except OverloadedError:
+        # Stays stale until a later login finds the pool less busy
+        logger.debug("Hash pool full, skipping rehash of user %s", user_id)
+    except Exception:
+        logger.exception("Failed to rehash password")
+
 @app.post("/login/")
-async def login(data: UserLogin):
-    with Session() as session:
-        #logger.debug(f"Calling login with data: {data}")
-        if is_username_password_valid(data.username, data.password, session=session):
-            user = retrieve_user(username_or_email=data.username, session=session)
-            if user.status == UserStatus.PENDING:
-                #logger.info(f"Attempt to login with pending user: {data.username}")
-                raise HTTPException(status_code=400, detail="Pending user.")
-            
-            elif user.status == UserStatus.BANNED:
-                #logger.info(f"Attempt to login with banned user: {data.username}")
-                raise HTTPException(status_code=400, detail="Banned user.")
-            
-            elif user.status == UserStatus.DELETED:
-                #logger.info(f"Attempt to login with deleted user: {data.username}")
-                raise HTTPException(status_code=400, detail="Deleted user.")
-            
-            elif user.status == UserStatus.INACTIVE:
-                #logger.info(f"Attempt to login with inactive user: {data.username}")
-                raise HTTPException(status_code=400, detail="Inactive user.")
-            
-            expiration_time = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-            data={"sub": user.id, "exp": expiration_time}
-            token = create_jwt_token(data=data, session=session)
-            return JSONResponse(content={"token": token}, status_code=200)
-        else:
-            #logger.info(f"Invalid login attempt for username: {data.username}")
-            raise HTTPException(status_code=400, detail="Incorrect username and password combination")
+async def login(data: UserLogin, request: Request, background_tasks: BackgroundTasks,
+                session: AsyncSession = Depends(get_session)):
+    logger.debug("Calling login for username: %s", data.username)
+    # Reject before any DB access or hashing
+    login_ip_limiter.hit(f"login:ip:{client_ip(request)}")
+    login_throttle.check_lockout(data.username)
+
+    # The account behind a username or an email, so both share one failure budget
+    account_ids = []
+    def check_account(account: User):
+        account_ids.append(account.id)
+        login_throttle.check_lockout(data.username, user_id=account.id)
+
+    user = await authenticate_user(data.username, data.password, session=session, check=check_account)
+    if user is not None:
+        if user.status == UserStatus.PENDING:
+            logger.info("Attempt to login with pending user: %s", data.username)
+            audit_log.record("login_failed", ip=client_ip(request), username=data.username, detail="pending")
+            raise HTTPException(status_code=400, detail="Pending user.")
+        
+        elif user.status == UserStatus.BANNED:
+            logger.info("Attempt to login with banned user: %s", data.username)
+            audit_log.record("login_failed", ip=client_ip(request), username=data.username, detail="banned")
+            raise HTTPException(status_code=400, detail="Banned user.")
+        
+        elif user.status == UserStatus.DELETED:
+            logger.info("Attempt to login with deleted user: %s", data.username)
+            audit_log.record("login_failed", ip=client_ip(request), username=data.username, detail="deleted")
+            raise HTTPException(status_code=400, detail="Deleted user.")
+        
+        elif user.status == UserStatus.INACTIVE:
+            logger.info("Attempt to login with inactive user: %s", data.username)
+            audit_log.record("login_failed", ip=client_ip(request), username=data.username, detail="inactive")
+            raise HTTPException(status_code=400, detail="Inactive user.")
+        
+        # Only a login that issues a token clears the failure count
+        login_throttle.record_success(data.username, user_id=user.id)
+        audit_log.record("login", ip=client_ip(request), user_id=user.id)
+        if needs_rehash(user.password):
+            background_tasks.add_task(rehash_user_password, user.id, user.password, data.password)
+
+        expiration_time = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        data={"sub": str(user.id), "exp": expiration_time}
+        token = await create_jwt_token(data=data, session=session)
+        refresh_token = await issue_refresh_token(user.id, session=session)
+        return JSONResponse(content={"token": token, "refresh_token": refresh_token}, status_code=200)
+    else:
+        logger.info("Invalid login attempt for username: %s", data.username)
+        login_throttle.record_failure(data.username, user_id=account_ids[0] if account_ids else None)
+        audit_log.record("login_failed", ip=client_ip(request), username=data.username, detail="credentials")
+        raise HTTPException(status_code=400, detail="Incorrect username and password combination")
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@app.post("/refresh/")
+async def refresh(data: RefreshRequest, session: AsyncSession = Depends(get_session)):
+    """Trade a refresh token for a new access token and refresh token, without a password check."""
+    logger.debug("Calling refresh")
+    rotated = await rotate_refresh_token(data.refresh_token, session=session)
+    if rotated is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired refresh token")
+    user_id, refresh_token = rotated
+    expiration_time = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    token = await create_jwt_token(data={"sub": str(user_id), "exp": expiration_time}, session=session)
+    return JSONResponse(content={"token": token, "refresh_token": refresh_token}, status_code=200)
 
 
 class UserRegistration(BaseModel):
@@ -107,122 +274,491 @@ class UserRegistration(BaseModel):
     email: EmailStr
     password: str
 
+USER_REGISTERED = encode({"message": "User registered successfully."})
+
 @app.post("/register/")
-async def register(data: UserRegistration):
-    #logger.debug(f"Calling register with data: {data}")
+async def register(data: UserRegistration, session: AsyncSession = Depends(get_session)):
+    logger.debug("Calling register for username: %s", data.username)
     try:
         userdata = data.__dict__
         userdata['status'] = UserStatus.ACTIVE # TODO: change this to PENDING
-        with Session() as session:
-            insert_user(userdata=userdata, session=session)
-        return JSONResponse(content={"message": "User registered successfully."}, status_code=200)
+        await insert_user(userdata=userdata, session=session)
+        forget_missing_emails([userdata["email"]])
+        return PreEncodedJSONResponse(USER_REGISTERED)
     
     except IntegrityError as e:
-        #logger.info(f"IntegrityError: {str(e)}")
+        logger.info("IntegrityError: %s", e)
         raise HTTPException(status_code=400, detail="Username or email already exists.")
     
     except DatabaseInsertionError as e:
-        #logger.info(f"DatabaseInsertionError: {str(e)}")
+        logger.info("DatabaseInsertionError: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+
+    except (OverloadedError, PoolTimeoutError):
+        raise
     
     except Exception as e:
-        #logger.critical(e)
+        logger.exception("Unexpected error in register")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-class ValidateToken(BaseModel):
-    token: str
-    # type: str or TokenType (TokenType is an enum represented by int) NOTE: Problems?
-@app.post("/validate-token/")
-async def validate_token(data: ValidateToken):
-    #logger.debug(f"Calling validate-token with data: {data}")
-    with Session() as session:
-        token = session.query(Token).filter(
-            Token.token == data.token,
-            Token.expiration_time > datetime.utcnow()
-        ).first()
-
-        if token is not None and token.status == TokenStatus.ACTIVE:
-            return JSONResponse(content={"message": "Token is valid."}, status_code=200)
+# Token-only bodies are parsed by read_token instead of a pydantic model; this
+# keeps them documented in the OpenAPI schema.
+# NOTE: type: str or TokenType (TokenType is an enum represented by int)?
+TOKEN_BODY_OPENAPI = {"requestBody": {"required": True, "content": {"application/json": {"schema": {
+    "title": "ValidateToken", "type": "object", "required": ["token"],
+    "properties": {"token": {"title": "Token", "type": "string"}},
+}}}}}
+
+async def read_token(request: Request) -> str:
+    """Return the token from a {"token": "..."} body with one orjson.loads call.
+
+    Same 422 as the ValidateToken model on bad input, without building a model
+    and solving a body field per request on the hottest routes.
+    """
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        body = None
+    token = body.get("token") if isinstance(body, dict) else None
+    if not isinstance(token, str):
+        raise RequestValidationError([{"type": "missing", "loc": ("body", "token"),
+                                       "msg": "Field required", "input": body}])
+    return token
+
+TOKEN_VALID = encode({"message": "Token is valid."})
+
+@app.post("/validate-token/", openapi_extra=TOKEN_BODY_OPENAPI)
+async def validate_token(request: Request):
+    logger.debug("Calling validate-token")
+    token_value = await read_token(request)
+    # Access tokens are JWTs; reset tokens are opaque and still go to the DB
+    if TOKEN_VALIDATION_MODE == "stateless" and is_jwt(token_value):
+        if verify_access_token(token_value):
+            return PreEncodedJSONResponse(TOKEN_VALID)
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+
+    if await lookup_token_status(token_value) == TokenStatus.ACTIVE.name:
+        return PreEncodedJSONResponse(TOKEN_VALID)
     
     raise HTTPException(status_code=400, detail="Invalid or expired token")
 
+async def lookup_token_status(token_value: str):
+    """TokenStatus name of an unexpired token from the token cache or the database, None if unknown."""
+    # Read-your-writes: make sure tokens buffered by this worker are committed
+    if token_writer.is_pending(token_value):
+        await token_writer.flush()
+    status = token_cache.get(token_value)
+    if status is None and negative_cache.get(missing_token_key(token_value)) is None:
+        # Only cache misses need a session
+        async with AsyncSessionLocal() as session:
+            token = await session.scalar(select(Token).where(
+                Token.token == token_value,
+                Token.expiration_time > datetime.utcnow()
+            ))
+        if token is not None:
+            status = token.status.name
+            token_cache.set(token_value, status, expires_at=token.expiration_time)
+        else:
+            remember_missing_token(missing_token_key(token_value))
+    return status
+
+# Public keys only; empty with a shared-secret ALGORITHM. Consumers may cache
+# it briefly, rotation publishes a new key well before it signs anything.
+JWKS = encode(key_ring.jwks())
+
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    return PreEncodedJSONResponse(JWKS, headers={"Cache-Control": "public, max-age=300"})
+
+@app.get("/cache-stats/")
+async def cache_stats():
+    return JSONResponse(content={**token_cache.stats(), "negative": negative_cache.stats()}, status_code=200)
+
+########################### Metrics ###########################
+instrument_engine(engine)
+instrument_sessions()
+instrument_pool(engine, DB_MAX_OVERFLOW)
+
+# Most statements one request may issue, background tasks included, with the
+# write-behind buffer off. Exceeding one is logged and fails query_budget() in tests.
+QUERY_BUDGETS.update({
+    "/login/": 4,               # user, access token, refresh token, stale hash rewrite
+    "/refresh/": 5,             # refresh token, user, mark used, new refresh token, access token
+    "/validate-token/": 1,
+    "/me/": 2,                  # token (database mode), user
+    "/register/": 1,
+    "/forgotten-password/": 2,  # user by email, reset token
+    "/reset-password/": 4,      # reset token, password, refresh tokens, reset token status
+    "/logout/": 2,
+    "/logout-all/": 3,
+    "/admin/revoke-tokens/": 3,
+    "/admin/user-status/": 4,
+})
+
+for name, documentation, callback, kind in [
+    ("token_cache_hits_total", "Token cache hits.", lambda: token_cache.hits, "counter"),
+    ("token_cache_misses_total", "Token cache misses.", lambda: token_cache.misses, "counter"),
+    ("token_cache_evictions_total", "Token cache evictions.", lambda: token_cache.evictions, "counter"),
+    ("token_cache_size", "Entries in the token cache.", lambda: len(token_cache), "gauge"),
+    ("negative_cache_hits_total", "Lookups answered by the negative cache.", lambda: negative_cache.hits, "counter"),
+    ("negative_cache_misses_total", "Lookups the negative cache could not answer.", lambda: negative_cache.misses, "counter"),
+    ("negative_cache_size", "Entries in the negative cache.", lambda: len(negative_cache), "gauge"),
+    ("user_cache_hits_total", "User cache hits.", lambda: user_cache.hits, "counter"),
+    ("user_cache_misses_total", "User cache misses.", lambda: user_cache.misses, "counter"),
+    ("user_cache_size", "Entries in the user cache.", lambda: len(user_cache), "gauge"),
+    ("hash_pool_pending", "Hash calls running or queued.", lambda: hash_executor.pending, "gauge"),
+    ("token_writes_buffered", "Token writes waiting in the write-behind buffer.", lambda: len(token_writer), "gauge"),
+    ("token_writes_dropped_total", "Buffered token writes dropped after failing on their own.", lambda: token_writer.dropped, "counter"),
+    ("emails_sent_total", "Emails handed to the mail transport.", lambda: mail_queue.sent, "counter"),
+    ("emails_dropped_total", "Emails dropped because the mail queue was full.", lambda: mail_queue.dropped, "counter"),
+    ("audit_events_written_total", "Audit events written to disk.", lambda: audit_log.written, "counter"),
+    ("audit_events_dropped_total", "Audit events dropped by a full buffer or a failed write.", lambda: audit_log.dropped, "counter"),
+    ("audit_events_buffered", "Audit events waiting to be written.", lambda: len(audit_log), "gauge"),
+    ("shared_state_failures_total", "Shared state calls that found the file locked past the busy timeout.",
+     lambda: shared_store.failures if shared_store is not None else 0, "counter"),
+    ("rate_limit_fallbacks_total", "Rate-limit counter calls served by the per-process store instead of the shared one.",
+     lambda: getattr(rate_limit_store, "fallbacks", 0), "counter"),
+    ("worker_ready", "1 once warm-up has finished.", lambda: int(readiness.ready), "gauge"),
+    ("cold_start_seconds", "Worker start to ready.", lambda: readiness.cold_start_seconds or 0, "gauge"),
+]:
+    registry.register(CallbackMetric(name, documentation, callback, kind))
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+async def healthz():
+    """Readiness probe: 503 until warm-up has finished and again once shutdown starts."""
+    return JSONResponse(content=readiness.status(), status_code=200 if readiness.ready else 503)
+
 ########################### Logout ###########################
-class LogoutToken(BaseModel):
-    token: str
+LOGGED_OUT = encode({"message": "Logged out successfully."})
 
-@app.post("/logout/")
-async def logout(data: ValidateToken):
-    with Session() as session:
-        # Retrieve the token from the database
-        # TODO: is it possible to improve this query?
-        # token = session.query(Token).filter(Token.token == data.token,
-        #                                     Token.type == TokenType.ACCESS).first()
-        token = session.query(Token).filter(Token.token == data.token,
-                                            Token.status == TokenStatus.ACTIVE).first()
-        if token:
-            # Invalidate the token
-            token.status = TokenStatus.LOGGED_OUT
-            session.commit()
-            return JSONResponse(content={"message": "Logged out successfully."}, status_code=200)
+@app.post("/logout/", openapi_extra=TOKEN_BODY_OPENAPI)
+async def logout(request: Request, session: AsyncSession = Depends(get_session)):
+    token_value = await read_token(request)
+    if token_writer.is_pending(token_value):
+        await token_writer.flush()
+    if negative_cache.get(missing_token_key(token_value)) is not None:
+        raise HTTPException(status_code=400, detail="Invalid token.")
+    # Retrieve the token from the database
+    # TODO: is it possible to improve this query?
+    # token = await session.scalar(select(Token).where(Token.token == token_value,
+    #                                                  Token.type == TokenType.ACCESS))
+    token = await session.scalar(select(Token).where(Token.token == token_value,
+                                                     Token.status == TokenStatus.ACTIVE))
+    if token:
+        # Invalidate the token
+        await set_token_status(token, TokenStatus.LOGGED_OUT, session=session)
+        forget_revoked_tokens([(token_value, TokenType.ACCESS, token.expiration_time)])
+        return PreEncodedJSONResponse(LOGGED_OUT)
     
+    remember_missing_token(missing_token_key(token_value))
     raise HTTPException(status_code=400, detail="Invalid token.")
 
+def apply_invalidation(token: str, revoked_access: bool, expires_at: float):
+    if token.startswith(USER_KEY_PREFIX):
+        user_cache.invalidate(token)
+        return
+    if token.startswith(EMAIL_KEY_PREFIX):
+        negative_cache.invalidate(token)
+        return
+    token_cache.invalidate(token)
+    if TOKEN_VALIDATION_MODE == "stateless" and revoked_access:
+        revocation_list.add(token, expires_at)
+
+def forget_revoked_tokens(revoked: list):
+    """Drop revoked or used tokens from this worker's caches, and the other workers' through the shared store."""
+    for token, token_type, expiration_time in revoked:
+        expires_at = to_timestamp(expiration_time) if expiration_time is not None else time.time()
+        revoked_access = token_type == TokenType.ACCESS
+        apply_invalidation(token, revoked_access, expires_at)
+        if shared_store is not None:
+            shared_store.publish(token, expires_at, revoked_access)
+
+def forget_missing_emails(emails: list):
+    """New users were inserted: other workers may still cache their emails as unknown."""
+    if shared_store is not None:
+        for email in emails:
+            shared_store.publish(missing_email_key(email), time.time() + NEGATIVE_CACHE_TTL, False)
+
+def forget_users(user_ids: list):
+    """Drop cached principals after a status or password change, here and in the other workers."""
+    for user_id in user_ids:
+        invalidate_user(user_id)
+        if shared_store is not None:
+            shared_store.publish(user_key(user_id), time.time(), False)
+
+@app.post("/logout-all/", openapi_extra=TOKEN_BODY_OPENAPI)
+async def logout_all(request: Request, session: AsyncSession = Depends(get_session)):
+    """Log the token's owner out everywhere: every active token of the user is revoked in one UPDATE."""
+    token_value = await read_token(request)
+    if token_writer.is_pending(token_value):
+        await token_writer.flush()
+    token = await session.scalar(select(Token).where(Token.token == token_value,
+                                                     Token.type == TokenType.ACCESS,
+                                                     Token.status == TokenStatus.ACTIVE,
+                                                     Token.expiration_time > datetime.utcnow()))
+    if token is None:
+        raise HTTPException(status_code=400, detail="Invalid token.")
+
+    # Committed together with the access tokens by revoke_user_tokens
+    await revoke_user_refresh_tokens([token.user_id], session=session)
+    revoked = await revoke_user_tokens([token.user_id], TokenStatus.LOGGED_OUT, session=session)
+    forget_revoked_tokens(revoked)
+    audit_log.record("tokens_revoked", ip=client_ip(request), user_id=token.user_id, detail="logout_all")
+    return JSONResponse(content={"message": "Logged out everywhere.", "revoked": len(revoked)}, status_code=200)
+
+
+########################### Bulk Operations ###########################
+def require_admin(x_admin_key: str = Header(None)):
+    if not ADMIN_API_KEY or x_admin_key is None or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Forbidden.")
+
+async def read_bulk_rows(request: Request):
+    """Yield the rows of a JSON array body, or of an NDJSON body line by line as it streams in.
+
+    Lines that are not valid JSON are yielded as None so the caller can
+    report them by index.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+        if buffer.strip():
+            try:
+                yield json.loads(buffer)
+            except ValueError:
+                yield None
+        return
+
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request.")
+    for row in rows:
+        yield row
+
+def validation_message(error: ValidationError) -> str:
+    """Field and reason of each problem, without the offending input."""
+    return "; ".join(f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+                     for detail in error.errors(include_input=False))
+
+@app.post("/register/bulk/", dependencies=[Depends(require_admin)])
+async def register_bulk(request: Request, session: AsyncSession = Depends(get_session)):
+    """Register many users from a JSON array or NDJSON stream of /register/ bodies.
+
+    Rows are validated, then inserted BULK_CHUNK_SIZE at a time with the
+    passwords hashed in parallel. Each chunk is committed on its own; failed
+    rows are reported by their position in the input.
+    """
+    inserted = 0
+    failed = []
+    chunk = []
+
+    def report(status_code: int, detail: str = None) -> JSONResponse:
+        # Chunk failures are found after later validation failures, keep the input order
+        content = {"inserted": inserted, "failed": sorted(failed, key=lambda failure: failure["index"])}
+        if detail is not None:
+            content = {"detail": detail, **content}
+        return JSONResponse(content=content, status_code=status_code)
+
+    async def insert_chunk():
+        nonlocal inserted
+        errors = await insert_users([userdata for _, userdata in chunk], session=session)
+        inserted += len(chunk) - len(errors)
+        forget_missing_emails([userdata["email"] for position, (_, userdata) in enumerate(chunk) if position not in errors])
+        failed.extend({"index": chunk[position][0], "error": error} for position, error in sorted(errors.items()))
+        chunk.clear()
+
+    index = -1
+    try:
+        async for row in read_bulk_rows(request):
+            index += 1
+            if index >= BULK_MAX_ROWS:
+                if chunk:
+                    await insert_chunk()
+                return report(413, f"At most {BULK_MAX_ROWS} rows per request, stopped there.")
+            try:
+                userdata = UserRegistration(**row).__dict__ if isinstance(row, dict) else None
+            except ValidationError as e:
+                # Never echo the input back, it holds the password
+                failed.append({"index": index, "error": validation_message(e)})
+                continue
+            if userdata is None:
+                failed.append({"index": index, "error": "Row is not a JSON object."})
+                continue
+            userdata["status"] = UserStatus.ACTIVE
+            chunk.append((index, userdata))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await insert_chunk()
+        if chunk:
+            await insert_chunk()
+    except (OverloadedError, PoolTimeoutError) as e:
+        # Earlier chunks are committed: tell the caller which rows made it
+        if isinstance(e, PoolTimeoutError):
+            DB_POOL_TIMEOUTS.inc()
+        logger.warning("Bulk registration stopped after %d inserted: %s", inserted, e)
+        failed.extend({"index": position, "error": "Not inserted, server overloaded."} for position, _ in chunk)
+        response = report(503, f"Server overloaded, stopped after row {index}. Rows after it were not read.")
+        response.headers["Retry-After"] = "1"
+        return response
+
+    logger.info("Bulk registration: %d inserted, %d failed", inserted, len(failed))
+    return report(200)
+
+
+class RevokeTokensRequest(BaseModel):
+    users: list[str]  # usernames or emails
+
+@app.post("/admin/revoke-tokens/", dependencies=[Depends(require_admin)])
+async def revoke_tokens(data: RevokeTokensRequest, request: Request, session: AsyncSession = Depends(get_session)):
+    """Revoke every active token of the listed users with a single UPDATE."""
+    rows = await session.execute(select(User.id, User.username, User.email).where(
+        or_(User.username.in_(data.users), User.email.in_(data.users))
+    ))
+    user_ids, known = [], set()
+    for user_id, username, email in rows:
+        user_ids.append(user_id)
+        known.update((username, email))
+    unknown = [user for user in data.users if user not in known]
+
+    revoked = []
+    if user_ids:
+        await revoke_user_refresh_tokens(user_ids, session=session)
+        revoked = await revoke_user_tokens(user_ids, TokenStatus.LOGGED_OUT, session=session)
+    forget_revoked_tokens(revoked)
+    logger.warning("Revoked %d tokens of %d users", len(revoked), len(user_ids))
+    for user_id in user_ids:
+        audit_log.record("tokens_revoked", ip=client_ip(request), user_id=user_id, detail="admin")
+    return JSONResponse(content={"revoked": len(revoked), "unknown": unknown}, status_code=200)
+
 
 ########################### Password Reset ###########################    
 def send_reset_email(email: str, token: str):
-    #logger.critical(f"Sending http://localhost:3000/reset-password?token={token} to {email}")
-    pass
-
-class ForgottenPasswordRequest(BaseModel):
-    email: str
+    logger.info("Queueing password reset email to %s", email)
+    mail_queue.submit(build_message(
+        to=email,
+        subject="Reset your password",
+        body=f"Use this link to reset your password: http://localhost:3000/reset-password?token={token}",
+    ))
 
-@app.post("/forgotten-password/")
-async def forgot_password(data: ForgottenPasswordRequest):
-    #logger.debug(f"Calling forgot_password with data: {data}")
+async def issue_reset_token(email: str, ip: str = None):
+    """Runs after the response is sent, so the caller cannot tell from timing whether the email exists."""
     try:
-        with Session() as session:
-            user = session.query(User).filter(User.email == data.email).first()
+        if negative_cache.get(missing_email_key(email)) is not None:
+            audit_log.record("reset_requested", ip=ip, email=email, detail="unknown_email")
+            return
+        async with AsyncSessionLocal() as session:
+            user = await session.scalar(select(User).where(User.email == email))
             if user is not None:
                 token = secrets.token_urlsafe(32)
                 expiration_time = datetime.utcnow() + timedelta(minutes=10)
-                insert_token(user_id=user.id,
-                             token=token,
-                             type=TokenType.RESET_PASSWORD,
-                             status=TokenStatus.ACTIVE,
-                             expiration_time=expiration_time,
-                             session=session)
+                await insert_token(user_id=user.id,
+                                   token=token,
+                                   type=TokenType.RESET_PASSWORD,
+                                   status=TokenStatus.ACTIVE,
+                                   expiration_time=expiration_time,
+                                   session=session)
                 send_reset_email(user.email, token)
+                audit_log.record("reset_requested", ip=ip, user_id=user.id)
             else:
-                # TODO: log this to a specific file/db -> IP, email, time, ...
-                pass
-        return JSONResponse(content={"message": "If your email is registered, you will receive a password reset link."},
-                            status_code=200)
-    except Exception as e:
-        #logger.critical(e)
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+                negative_cache.set(missing_email_key(email), MISSING)
+                audit_log.record("reset_requested", ip=ip, email=email, detail="unknown_email")
+    except Exception:
+        logger.exception("Failed to issue reset token")
+
+class ForgottenPasswordRequest(BaseModel):
+    email: str
+
+RESET_EMAIL_QUEUED = encode({"message": "If your email is registered, you will receive a password reset link."})
+
+@app.post("/forgotten-password/")
+async def forgot_password(data: ForgottenPasswordRequest, request: Request, background_tasks: BackgroundTasks):
+    logger.debug("Calling forgot_password")
+    forgotten_ip_limiter.hit(f"forgotten:ip:{client_ip(request)}")
+    forgotten_email_limiter.hit(f"forgotten:email:{data.email.lower()}")
+    background_tasks.add_task(issue_reset_token, data.email, client_ip(request))
+    return PreEncodedJSONResponse(RESET_EMAIL_QUEUED)
+
+
+class UserStatusRequest(BaseModel):
+    users: list[str]  # usernames or emails
+    status: str  # UserStatus name, e.g. BANNED
+
+@app.post("/admin/user-status/", dependencies=[Depends(require_admin)])
+async def set_user_status(data: UserStatusRequest, request: Request, session: AsyncSession = Depends(get_session)):
+    """Change the status of the listed users, e.g. to ban them. Anything but ACTIVE also revokes their tokens."""
+    if data.status not in UserStatus.__members__:
+        raise HTTPException(status_code=400, detail="Unknown status.")
+    status = UserStatus[data.status]
+    user_ids = list(await session.scalars(select(User.id).where(
+        or_(User.username.in_(data.users), User.email.in_(data.users))
+    )))
+    revoked = []
+    if user_ids:
+        await session.execute(update(User).where(User.id.in_(user_ids)).values(status=status))
+        if status == UserStatus.ACTIVE:
+            await session.commit()
+        else:
+            await revoke_user_refresh_tokens(user_ids, session=session)
+            revoked = await revoke_user_tokens(user_ids, TokenStatus.LOGGED_OUT, session=session)
+    forget_revoked_tokens(revoked)
+    forget_users(user_ids)
+    logger.warning("Set status %s on %d users", status.name, len(user_ids))
+    for user_id in user_ids:
+        audit_log.record("user_status", ip=client_ip(request), user_id=user_id, detail=status.name)
+    return JSONResponse(content={"updated": len(user_ids), "revoked": len(revoked)}, status_code=200)
 
 
 class ResetPasswordRequest(BaseModel):
     token: str
     password: str
 
+PASSWORD_RESET = encode({"message": "Password reset successfully."})
+
 @app.post("/reset-password/")
-async def reset_password(data: ResetPasswordRequest):
-    #logger.debug(f"Calling reset-password with data: {data}")
-    with Session() as session:
-        reset_token = session.query(Token).filter(
-            Token.token == data.token,
-            Token.expiration_time > datetime.utcnow(),
-            Token.type == TokenType.RESET_PASSWORD,
-        ).first()
+async def reset_password(data: ResetPasswordRequest, request: Request, session: AsyncSession = Depends(get_session)):
+    logger.debug("Calling reset-password")
+    if token_writer.is_pending(data.token):
+        await token_writer.flush()
+    if (negative_cache.get(missing_reset_key(data.token)) is not None
+            or negative_cache.get(missing_token_key(data.token)) is not None):
+        audit_log.record("password_reset_failed", ip=client_ip(request))
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+    reset_token = await session.scalar(select(Token).where(
+        Token.token == data.token,
+        Token.expiration_time > datetime.utcnow(),
+        Token.type == TokenType.RESET_PASSWORD,
+    ))
 
     if reset_token is not None and reset_token.status == TokenStatus.ACTIVE:
-        modify_user_password(reset_token.user_id, data.password, session=session)
+        # Password change and token status are committed together
+        await modify_user_password(reset_token.user_id, data.password, session=session)
+        # A new password ends every session that a leaked refresh token could keep alive
+        await revoke_user_refresh_tokens([reset_token.user_id], session=session)
         reset_token.status = TokenStatus.USED
-        session.commit()
-        # TODO: log this to a specific file/db -> IP, email, time, ... + add field last time password was reset?
-        return JSONResponse(content={"message": "Password reset successfully."}, status_code=200)
+        await session.commit()
+        forget_revoked_tokens([(data.token, TokenType.RESET_PASSWORD, reset_token.expiration_time)])
+        forget_users([reset_token.user_id])
+        audit_log.record("password_reset", ip=client_ip(request), user_id=reset_token.user_id)
+        return PreEncodedJSONResponse(PASSWORD_RESET)
 
+    if reset_token is None:
+        remember_missing_token(missing_reset_key(data.token))
+    audit_log.record("password_reset_failed", ip=client_ip(request))
     raise HTTPException(status_code=400, detail="Invalid or expired token")
 
 
@@ -238,13 +774,37 @@ async def get_current_user(token: str = Depends(oauth2_scheme)): # TODO: Underst
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with timed("jwt_decode"):
+            payload = key_ring.decode(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
         return user_id
     except JWTError:
         raise credentials_exception
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Dependency for protected routes: the active user behind a valid, unrevoked access token.
+
+    On a warm worker this costs a JWT decode and two cache lookups.
+    """
+    user_id = await get_current_user(token)
+    if TOKEN_VALIDATION_MODE == "stateless":
+        revoked = revocation_list.is_revoked(token)
+    else:
+        revoked = await lookup_token_status(token) != TokenStatus.ACTIVE.name
+    if revoked:
+        raise HTTPException(status_code=401, detail="Could not validate credentials.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    principal = await load_principal(int(user_id), AsyncSessionLocal)
+    if principal is None or principal.status != UserStatus.ACTIVE:
+        raise HTTPException(status_code=403, detail="Inactive user.")
+    return principal
+
+@app.get("/me/")
+async def me(principal: Principal = Depends(get_current_principal)):
+    return JSONResponse(content={"id": principal.id, "username": principal.username, "email": principal.email},
+                        status_code=200)
     
-# NOTE: datetime.utcfromtimestamp(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])['exp'])
+# NOTE: datetime.utcfromtimestamp(key_ring.decode(token)['exp'])
 # We have to use utc always.
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""Prometheus-style metrics without extra dependencies.
+
+Counters and histograms live in process memory and are rendered in the
+Prometheus text exposition format by the /metrics route. Observations are a
+dict lookup plus a bisect, cheap enough to leave on in production.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from api.logger import get_logger
+from api.querystats import QUERY_STATS_HEADERS, current_stats, track_queries
+
+logger = get_logger(__name__)
+
+# Seconds. Covers cache hits (sub-millisecond) up to slow password hashing calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        series = self._values.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), labelvalues + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Single value read from a callback at scrape time, e.g. a cache's own counters."""
+
+    def __init__(self, name: str, documentation: str, callback, kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {self.callback()}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_COUNT = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+# Stages: db_session, db_query, password_hash, jwt_encode, jwt_decode, serialization
+STAGE_LATENCY = registry.register(Histogram(
+    "stage_duration_seconds", "Time spent in each stage of request handling.", ("stage",)))
+DB_POOL_TIMEOUTS = registry.register(Counter(
+    "db_pool_timeouts_total", "Requests that gave up waiting for a pooled connection (answered with 503)."))
+REQUEST_STATEMENTS = registry.register(Histogram(
+    "db_statements_per_request", "Database statements issued by one request, by route.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50)))
+
+
+class timed:
+    """Context manager adding the elapsed time of its block to STAGE_LATENCY."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        STAGE_LATENCY.observe(time.perf_counter() - self.start, self.stage)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request counts, latency and statements.
+
+    Unknown paths are grouped under "other" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_label(self, scope) -> str:
+        if self._routes is None:
+            router = scope["app"].router
+            self._routes = {route.path for route in router.routes}
+        path = scope["path"]
+        return path if path in self._routes else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        route = self._route_label(scope)
+
+        with track_queries(route) as stats:
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if QUERY_STATS_HEADERS:
+                        # Statements run after this point (background tasks) are not included
+                        message["headers"] = [*message.get("headers", []), *stats.headers()]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                REQUEST_COUNT.inc(scope["method"], route, str(status_code))
+                REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route)
+                REQUEST_STATEMENTS.observe(stats.statements, scope["method"], route)
+                if stats.over_budget():
+                    logger.warning("%s issued %d statements, over its budget", route, stats.statements)
+                for statement, times in stats.repeated():
+                    logger.warning("Possible N+1 on %s: statement ran %d times: %s", route, times, statement[:200])
+
+
+def instrument_engine(engine):
+    """Record query time from cursor events on the engine, and count statements per request."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        STAGE_LATENCY.observe(elapsed, "db_query")
+        stats = current_stats()
+        if stats is not None:
+            stats.add(statement, cursor.rowcount, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute does not fire for failed statements
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+
+def instrument_sessions(session_class=Session):
+    """Record how long the first statement of a session waits for a connection."""
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def do_orm_execute(orm_execute_state):
+        session = orm_execute_state.session
+        if not session.in_transaction():
+            session.info["acquire_start"] = time.perf_counter()
+
+    @event.listens_for(session_class, "after_begin")
+    def after_begin(session, transaction, connection):
+        start = session.info.pop("acquire_start", None)
+        if start is not None:
+            STAGE_LATENCY.observe(time.perf_counter() - start, "db_session")
+
+
+def instrument_pool(engine, max_overflow: int):
+    """Gauges for a QueuePool: connections in use, open and allowed. Other pools (SQLite's NullPool) are skipped.
+
+    Time spent waiting for a connection is the db_session stage.
+    """
+    pool = getattr(engine, "sync_engine", engine).pool
+    if not hasattr(pool, "checkedout"):
+        return
+    for name, documentation, callback in [
+        ("db_pool_checked_out", "Connections currently handed out.", pool.checkedout),
+        ("db_pool_open", "Connections open, in use or idle.", lambda: pool.checkedout() + pool.checkedin()),
+        ("db_pool_max", "Connections the pool may open, pool size plus overflow.", lambda: pool.size() + max_overflow),
+    ]:
+        registry.register(CallbackMetric(name, documentation, callback))
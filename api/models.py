@@ -0,0 +1,49 @@
+"""Tables owned by this service rather than by login_db.
+
+They live on their own metadata so login_db's create_all() never sees them.
+ensure_tables() creates any that are missing; it runs at startup and is
+safe to repeat.
+"""
+import enum
+from datetime import datetime
+
+from sqlalchemy import DateTime, Enum, Integer, String
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class RefreshTokenStatus(enum.Enum):
+    ACTIVE = "ACTIVE"
+    USED = "USED"        # rotated; presenting it again means it was stolen
+    REVOKED = "REVOKED"
+
+
+class RefreshToken(Base):
+    """One refresh token. Tokens rotated from the same login share a family_id."""
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # sha256 of the token; the token itself is only ever known to the client
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    family_id: Mapped[str] = mapped_column(String(32), index=True)
+    user_id: Mapped[int] = mapped_column(Integer, index=True)
+    status: Mapped[RefreshTokenStatus] = mapped_column(Enum(RefreshTokenStatus, native_enum=False, length=16))
+    # The reaper deletes by expiration_time
+    expiration_time: Mapped[datetime] = mapped_column(DateTime, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+async def ensure_tables(engine):
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    except Exception:
+        # Another worker may be creating them at the same moment
+        logger.exception("Creating service tables failed")
@@ -0,0 +1,98 @@
+import math
+import os
+import time
+
+from passlib.context import CryptContext
+
+from api.logger import get_logger
+from api.metrics import timed
+
+logger = get_logger(__name__)
+
+# First scheme hashes new passwords; the others are still accepted and get
+# rehashed on the next successful login. bcrypt must stay in the list as long
+# as login_db writes bcrypt hashes. argon2 needs `pip install argon2-cffi`.
+PASSWORD_SCHEMES = [scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+# Work factor for the first scheme: bcrypt rounds or argon2 time_cost. Empty
+# means calibrate at startup so one verification takes about PASSWORD_HASH_TARGET_MS.
+PASSWORD_HASH_COST = os.getenv("PASSWORD_HASH_COST")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+ARGON2_MEMORY_KB = int(os.getenv("ARGON2_MEMORY_KB", "65536"))
+
+# setting name, lowest and highest cost calibration may pick
+COST_SETTINGS = {
+    "bcrypt": ("rounds", 10, 16),
+    "argon2": ("time_cost", 2, 16),
+}
+
+pwd_context = CryptContext(schemes=PASSWORD_SCHEMES, deprecated="auto",
+                           argon2__memory_cost=ARGON2_MEMORY_KB)
+
+
+def hash_password(password: str) -> str:
+    with timed("password_hash"):
+        return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    with timed("password_hash"):
+        return pwd_context.verify(password, hashed_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True for hashes from a deprecated scheme or below the current cost."""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except ValueError:
+        return False
+
+
+def set_cost(cost: int):
+    """Hash new passwords at `cost` and treat hashes below it as stale. Stronger hashes are kept."""
+    scheme = PASSWORD_SCHEMES[0]
+    setting = COST_SETTINGS[scheme][0]
+    pwd_context.update(**{f"{scheme}__default_{setting}": cost, f"{scheme}__min_{setting}": cost})
+
+
+def measure_verify(cost: int) -> float:
+    """Seconds one verification takes at `cost` with the default scheme."""
+    scheme = PASSWORD_SCHEMES[0]
+    setting = COST_SETTINGS[scheme][0]
+    handler = pwd_context.handler(scheme).using(**{setting: cost})
+    hashed = handler.hash("calibration")
+    start = time.perf_counter()
+    handler.verify("calibration", hashed)
+    return time.perf_counter() - start
+
+
+def calibrate(target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+    """Pick the highest cost whose verification stays within `target_ms` on this machine.
+
+    bcrypt doubles per round and argon2 grows linearly with time_cost, so
+    one measurement at the lowest cost is enough to extrapolate; the result
+    is then checked once and stepped down if it overshoots.
+    """
+    scheme = PASSWORD_SCHEMES[0]
+    _, lowest, highest = COST_SETTINGS[scheme]
+    target = target_ms / 1000
+    base = measure_verify(lowest)
+    if scheme == "bcrypt":
+        cost = lowest + math.floor(math.log2(max(target / base, 1)))
+    else:
+        cost = math.floor(lowest * target / base)
+    cost = min(max(cost, lowest), highest)
+    while cost > lowest and measure_verify(cost) > target * 1.25:
+        cost -= 1
+    return cost
+
+
+def configure_cost() -> int:
+    """Apply PASSWORD_HASH_COST, or calibrate one. Called once at startup."""
+    scheme = PASSWORD_SCHEMES[0]
+    if scheme not in COST_SETTINGS:
+        logger.info("No cost tuning for %s, using passlib defaults", scheme)
+        return None
+    cost = int(PASSWORD_HASH_COST) if PASSWORD_HASH_COST else calibrate()
+    set_cost(cost)
+    logger.info("Password hashing: %s with %s=%d", scheme, COST_SETTINGS[scheme][0], cost)
+    return cost
@@ -0,0 +1,53 @@
+"""The user behind an access token, cached per worker for protected routes.
+
+A protected route needs the caller's id and status on every request. The
+user row is cached for USER_CACHE_TTL seconds so most requests resolve it
+without a query. Anything that changes a user's status or password calls
+invalidate_user(); the TTL bounds how long a change made outside this
+service (e.g. directly through login_db) can go unnoticed.
+"""
+import os
+from typing import NamedTuple, Optional
+
+from login_db.models import User
+
+from api.cache import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Prefix of user invalidations in the shared invalidation log; tokens never contain ':'
+USER_KEY_PREFIX = "user:"
+
+
+class Principal(NamedTuple):
+    id: int
+    username: str
+    email: str
+    status: object  # UserStatus
+
+
+user_cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def user_key(user_id: int) -> str:
+    return f"{USER_KEY_PREFIX}{user_id}"
+
+
+async def load_principal(user_id: int, session_factory) -> Optional[Principal]:
+    """Return the cached principal, or load the user row. None if the user does not exist."""
+    key = user_key(user_id)
+    principal = user_cache.get(key)
+    if principal is not None:
+        return principal
+    async with session_factory() as session:
+        user = await session.get(User, user_id)
+    if user is None:
+        return None
+    principal = Principal(id=user.id, username=user.username, email=user.email, status=user.status)
+    user_cache.set(key, principal)
+    return principal
+
+
+def invalidate_user(user_id: int):
+    user_cache.invalidate(user_key(user_id))
@@ -0,0 +1,111 @@
+"""Per-request database statement counts, query budgets and N+1 detection.
+
+MetricsMiddleware opens a QueryStats for every request. The engine hooks
+installed by instrument_engine add each statement to it: count, rows and
+time, plus how often each distinct statement ran. A statement repeated
+QUERY_REPEAT_WARN times within one request is logged as a likely N+1.
+A route exceeding its entry in QUERY_BUDGETS is logged too.
+
+With QUERY_STATS_HEADERS=true the numbers are also sent as X-DB-* response
+headers. Tests can fail on an over-budget request with:
+
+    with query_budget() as requests:          # or query_budget(max_statements=2)
+        client.post("/login/", json=...)
+    requests.check()
+"""
+import os
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() in ("1", "true", "yes")
+# Same statement this many times in one request is reported as a likely N+1
+QUERY_REPEAT_WARN = int(os.getenv("QUERY_REPEAT_WARN", "5"))
+
+# Route path -> most statements one request may issue, declared next to the routes
+QUERY_BUDGETS = {}
+
+
+class QueryStats:
+    __slots__ = ("route", "statements", "rows", "seconds", "by_statement")
+
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.by_statement = Counter()
+
+    def add(self, statement: str, rows: int, seconds: float):
+        self.statements += 1
+        if rows > 0:
+            self.rows += rows
+        self.seconds += seconds
+        self.by_statement[statement] += 1
+
+    def repeated(self, threshold: int = QUERY_REPEAT_WARN) -> list:
+        """(statement, times) for statements run at least `threshold` times."""
+        return [(statement, times) for statement, times in self.by_statement.most_common() if times >= threshold]
+
+    def headers(self) -> list:
+        return [
+            (b"x-db-statements", str(self.statements).encode()),
+            (b"x-db-rows", str(self.rows).encode()),
+            (b"x-db-time-ms", f"{self.seconds * 1000:.2f}".encode()),
+        ]
+
+    def over_budget(self, max_statements: Optional[int] = None) -> bool:
+        budget = max_statements if max_statements is not None else QUERY_BUDGETS.get(self.route)
+        return budget is not None and self.statements > budget
+
+
+_current = ContextVar("query_stats", default=None)
+# Lists that query_budget() collects finished requests into
+_collectors = []
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries(route: Optional[str] = None):
+    """Count the statements run in this context (and tasks copied from it) into a new QueryStats."""
+    stats = QueryStats(route)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        for collector in _collectors:
+            collector.append(stats)
+
+
+class CapturedRequests(list):
+    def __init__(self, max_statements: Optional[int]):
+        super().__init__()
+        self.max_statements = max_statements
+
+    def check(self):
+        """Raise AssertionError naming every request over its budget."""
+        over = [f"{stats.route}: {stats.statements} statements, budget "
+                f"{self.max_statements if self.max_statements is not None else QUERY_BUDGETS.get(stats.route)}"
+                for stats in self if stats.over_budget(self.max_statements)]
+        if over:
+            raise AssertionError("Query budget exceeded: " + "; ".join(over))
+
+
+@contextmanager
+def query_budget(max_statements: Optional[int] = None):
+    """Collect the QueryStats of every request finished inside the block.
+
+    Works with TestClient, whose requests run in another thread. Budgets
+    come from QUERY_BUDGETS unless `max_statements` overrides them.
+    """
+    captured = CapturedRequests(max_statements)
+    _collectors.append(captured)
+    try:
+        yield captured
+    finally:
+        _collectors.remove(captured)
@@ -0,0 +1,209 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from api.exceptions import RateLimitedError, SharedStateUnavailableError
+from api.shared import shared_store
+
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests per window from one IP, per endpoint
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "20"))
+FORGOTTEN_RATE_LIMIT_PER_IP = int(os.getenv("FORGOTTEN_RATE_LIMIT_PER_IP", "5"))
+FORGOTTEN_RATE_LIMIT_PER_EMAIL = int(os.getenv("FORGOTTEN_RATE_LIMIT_PER_EMAIL", "3"))
+RATE_LIMIT_WINDOW_SECONDS = float(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+# Failed logins per username before it is locked out; 0 disables lockouts
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW_SECONDS = float(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "900"))
+# Each consecutive lockout lasts LOGIN_LOCKOUT_BACKOFF times longer, up to the max
+LOGIN_LOCKOUT_SECONDS = float(os.getenv("LOGIN_LOCKOUT_SECONDS", "60"))
+LOGIN_LOCKOUT_BACKOFF = float(os.getenv("LOGIN_LOCKOUT_BACKOFF", "2"))
+LOGIN_LOCKOUT_MAX_SECONDS = float(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", "3600"))
+
+
+class RateLimitStore:
+    """Interface for rate-limit counters. Implement it on a shared store (e.g. Redis) so workers agree."""
+
+    def get(self, key: str) -> float:
+        raise NotImplementedError
+
+    def incr(self, key: str, ttl: float) -> float:
+        raise NotImplementedError
+
+    def set(self, key: str, value: float, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryStore(RateLimitStore):
+    """Per-process store with expiring keys, capped at `max_keys` (least recently used go first)."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> float:
+        item = self._data.get(key)
+        if item is None:
+            return 0
+        value, expires_at = item
+        if expires_at <= time.time():
+            del self._data[key]
+            return 0
+        return value
+
+    def incr(self, key: str, ttl: float) -> float:
+        value = self.get(key) + 1
+        item = self._data.get(key)
+        expires_at = item[1] if item is not None else time.time() + ttl
+        self._store(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: float, ttl: float):
+        self._store(key, value, time.time() + ttl)
+
+    def _store(self, key: str, value: float, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+class FallbackStore(RateLimitStore):
+    """Counts in `primary` (the shared store), or in a per-process `fallback` while it is unavailable.
+
+    A lock timeout on the shared file must not read as 0: that would switch
+    off the limits exactly when contention peaks, e.g. during a credential
+    stuffing burst. Per-process counts are looser but still enforced.
+    """
+
+    def __init__(self, primary: RateLimitStore, fallback: MemoryStore):
+        self.primary = primary
+        self.fallback = fallback
+        self.fallbacks = 0
+
+    def _call(self, method: str, *args):
+        try:
+            return getattr(self.primary, method)(*args)
+        except SharedStateUnavailableError:
+            self.fallbacks += 1
+            return getattr(self.fallback, method)(*args)
+
+    def get(self, key: str) -> float:
+        # WAL readers are not blocked by a writer, so reads can succeed while
+        # increments land in the fallback; the larger of the two is enforced
+        return max(self._call("get", key), self.fallback.get(key))
+
+    def incr(self, key: str, ttl: float) -> float:
+        return self._call("incr", key, ttl)
+
+    def set(self, key: str, value: float, ttl: float):
+        self._call("set", key, value, ttl)
+
+    def delete(self, key: str):
+        # Both: a count taken in the fallback must not outlive a success
+        self.fallback.delete(key)
+        self._call("delete", key)
+
+    def clear(self):
+        self.fallback.clear()
+        self.primary.clear()
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counter approximated from the current and previous fixed windows.
+
+    Two counters per key instead of one timestamp per request, so memory does
+    not grow with the request rate.
+    """
+
+    def __init__(self, store: RateLimitStore, limit: int, window: float):
+        self.store = store
+        self.limit = limit
+        self.window = window
+
+    def hit(self, key: str):
+        """Count one request for `key`, raising RateLimitedError if it is over the limit."""
+        now = time.time()
+        window_id = int(now // self.window)
+        elapsed = now - window_id * self.window
+        current = self.store.get(f"{key}:{window_id}")
+        previous = self.store.get(f"{key}:{window_id - 1}")
+        estimate = previous * (1 - elapsed / self.window) + current
+        if estimate >= self.limit:
+            raise RateLimitedError(retry_after=self.window - elapsed)
+        self.store.incr(f"{key}:{window_id}", ttl=2 * self.window)
+
+
+class LoginThrottle:
+    """Lockouts after repeated failed logins, growing with each consecutive lockout.
+
+    Failures count against the name that was typed and, once the row is
+    known, against the account's user id. /login/ takes a username or an
+    email, so without the id each account would get one budget per form.
+    """
+
+    def __init__(self, store: RateLimitStore, max_failures: int, failure_window: float,
+                 lockout: float, backoff: float, max_lockout: float):
+        self.store = store
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.lockout = lockout
+        self.backoff = backoff
+        self.max_lockout = max_lockout
+
+    @staticmethod
+    def _identities(username: str, user_id: Optional[int]) -> list:
+        identities = [f"name:{username.lower()}"]
+        if user_id is not None:
+            identities.append(f"id:{user_id}")
+        return identities
+
+    def check_lockout(self, username: str, user_id: Optional[int] = None):
+        for identity in self._identities(username, user_id):
+            locked_until = self.store.get(f"lock:{identity}")
+            remaining = locked_until - time.time()
+            if remaining > 0:
+                raise RateLimitedError(retry_after=remaining)
+
+    def record_failure(self, username: str, user_id: Optional[int] = None):
+        if self.max_failures <= 0:
+            return
+        for identity in self._identities(username, user_id):
+            failures = self.store.incr(f"fail:{identity}", ttl=self.failure_window)
+            if failures < self.max_failures:
+                continue
+            level = self.store.incr(f"lockouts:{identity}", ttl=self.max_lockout + self.failure_window)
+            duration = min(self.lockout * self.backoff ** (level - 1), self.max_lockout)
+            self.store.set(f"lock:{identity}", time.time() + duration, ttl=duration)
+            self.store.delete(f"fail:{identity}")
+
+    def record_success(self, username: str, user_id: Optional[int] = None):
+        for identity in self._identities(username, user_id):
+            self.store.delete(f"fail:{identity}")
+            self.store.delete(f"lockouts:{identity}")
+
+
+# With SHARED_STATE_PATH set, all workers on the host count against the same limits
+rate_limit_store = (FallbackStore(shared_store, MemoryStore(max_keys=RATE_LIMIT_MAX_KEYS)) if shared_store is not None
+                    else MemoryStore(max_keys=RATE_LIMIT_MAX_KEYS))
+login_ip_limiter = SlidingWindowLimiter(rate_limit_store, LOGIN_RATE_LIMIT_PER_IP, RATE_LIMIT_WINDOW_SECONDS)
+forgotten_ip_limiter = SlidingWindowLimiter(rate_limit_store, FORGOTTEN_RATE_LIMIT_PER_IP, RATE_LIMIT_WINDOW_SECONDS)
+forgotten_email_limiter = SlidingWindowLimiter(rate_limit_store, FORGOTTEN_RATE_LIMIT_PER_EMAIL, RATE_LIMIT_WINDOW_SECONDS)
+login_throttle = LoginThrottle(rate_limit_store,
+                               max_failures=LOGIN_MAX_FAILURES,
+                               failure_window=LOGIN_FAILURE_WINDOW_SECONDS,
+                               lockout=LOGIN_LOCKOUT_SECONDS,
+                               backoff=LOGIN_LOCKOUT_BACKOFF,
+                               max_lockout=LOGIN_LOCKOUT_MAX_SECONDS)
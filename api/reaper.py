@@ -0,0 +1,157 @@
+"""Background cleanup of dead Token and RefreshToken rows and the indexes the API's queries need.
+
+Print or apply the recommended indexes with:
+    python -m api.reaper            # print DDL
+    python -m api.reaper --apply    # create missing indexes concurrently
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from login_db.enums import TokenStatus
+from login_db.models import Token
+from sqlalchemy import Index, MetaData, delete, inspect, or_, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from api.database import engine
+from api.logger import get_logger
+from api.models import RefreshToken, RefreshTokenStatus
+
+logger = get_logger(__name__)
+
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "true").lower() in ("1", "true", "yes")
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "300"))
+REAPER_CHUNK_SIZE = int(os.getenv("REAPER_CHUNK_SIZE", "1000"))
+# Keep expired rows around for a while, e.g. for support or audits
+REAPER_GRACE_MINUTES = float(os.getenv("REAPER_GRACE_MINUTES", "60"))
+# If set, reaped rows are moved to this table instead of being dropped
+REAPER_ARCHIVE_TABLE = os.getenv("REAPER_ARCHIVE_TABLE")
+# Same for refresh tokens; archiving tokens archives them too unless overridden
+REAPER_REFRESH_ARCHIVE_TABLE = os.getenv("REAPER_REFRESH_ARCHIVE_TABLE",
+                                         "refresh_token_archive" if REAPER_ARCHIVE_TABLE else None)
+
+# One index per query shape issued by the API, besides the lookups by token
+# value (validate / logout / reset-password), which the unique constraint's
+# own index already serves:
+# - logout-all and the admin revocations update a user's active tokens
+# - the reaper scans by expiration_time
+# - the stateless revocation refresh reads non-active tokens that have not expired
+# They are declared on a detached copy of the table so that login_db's own
+# create_all() never tries to build them inside a transaction.
+_token_table = Token.__table__.to_metadata(MetaData())
+TOKEN_INDEXES = [
+    Index("ix_token_expiration_time", _token_table.c.expiration_time, postgresql_concurrently=True),
+    Index("ix_token_user_id_status", _token_table.c.user_id, _token_table.c.status, postgresql_concurrently=True),
+    Index("ix_token_status_expiration_time", _token_table.c.status, _token_table.c.expiration_time,
+          postgresql_concurrently=True),
+]
+# Same name as the index create_all() builds on new tables, for tables created before it existed
+_refresh_token_table = RefreshToken.__table__.to_metadata(MetaData())
+REFRESH_TOKEN_INDEXES = [
+    Index("ix_refresh_tokens_expiration_time", _refresh_token_table.c.expiration_time,
+          postgresql_concurrently=True),
+]
+
+
+def reapable(now: datetime):
+    # LOGGED_OUT tokens stay until they expire: the stateless validation mode
+    # reads them to build its revocation list. Used reset tokens can go now.
+    return or_(Token.expiration_time < now - timedelta(minutes=REAPER_GRACE_MINUTES),
+               Token.status == TokenStatus.USED)
+
+
+def reapable_refresh(now: datetime):
+    # USED rows stay until they expire: presenting one again is how a stolen
+    # token is detected and its family revoked. REVOKED rows are never valid again.
+    return or_(RefreshToken.expiration_time < now - timedelta(minutes=REAPER_GRACE_MINUTES),
+               RefreshToken.status == RefreshTokenStatus.REVOKED)
+
+
+def archive_table(model) -> Optional[str]:
+    return REAPER_ARCHIVE_TABLE if model is Token else REAPER_REFRESH_ARCHIVE_TABLE
+
+
+async def reap_chunk(session, now: datetime, chunk_size: int = REAPER_CHUNK_SIZE, model=Token) -> int:
+    primary_key = inspect(model).primary_key[0]
+    chunk = (select(primary_key)
+             .where(reapable(now) if model is Token else reapable_refresh(now))
+             .limit(chunk_size)
+             .with_for_update(skip_locked=True)
+             .scalar_subquery())
+    statement = delete(model).where(primary_key.in_(chunk))
+
+    archive_name = archive_table(model)
+    if archive_name:
+        table = model.__table__
+        moved = statement.returning(*table.columns).cte("moved")
+        archive = table.to_metadata(MetaData(), name=archive_name)
+        result = await session.execute(archive.insert().from_select(list(moved.columns.keys()),
+                                                                    select(moved)))
+    else:
+        result = await session.execute(statement.execution_options(synchronize_session=False))
+    await session.commit()
+    return result.rowcount
+
+
+async def reap_expired_tokens(session_factory, chunk_size: int = REAPER_CHUNK_SIZE, model=Token) -> int:
+    """Delete reapable rows of `model` in chunks of `chunk_size`, each in its own transaction."""
+    now = datetime.utcnow()
+    total = 0
+    while True:
+        async with session_factory() as session:
+            deleted = await reap_chunk(session, now, chunk_size, model)
+        total += deleted
+        if deleted < chunk_size:
+            return total
+        # Let request handlers run between chunks
+        await asyncio.sleep(0)
+
+
+async def run_reaper(session_factory, interval: float = REAPER_INTERVAL_SECONDS):
+    while True:
+        try:
+            reaped = await reap_expired_tokens(session_factory)
+            if reaped:
+                logger.info("Reaped %d tokens", reaped)
+            reaped = await reap_expired_tokens(session_factory, model=RefreshToken)
+            if reaped:
+                logger.info("Reaped %d refresh tokens", reaped)
+        except Exception:
+            logger.exception("Token reaper failed")
+        await asyncio.sleep(interval)
+
+
+def index_ddl() -> list:
+    statements = []
+    for index in TOKEN_INDEXES + REFRESH_TOKEN_INDEXES:
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+        statements.append(ddl.strip())
+    return statements
+
+
+async def apply_indexes():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for index in TOKEN_INDEXES + REFRESH_TOKEN_INDEXES:
+            await connection.execute(CreateIndex(index, if_not_exists=True))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="create the indexes instead of printing them")
+    args = parser.parse_args()
+
+    if args.apply:
+        asyncio.run(apply_indexes())
+    else:
+        for statement in index_ddl():
+            print(statement + ";")
+
+
+if __name__ == "__main__":
+    main()
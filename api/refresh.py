@@ -0,0 +1,115 @@
+"""Rotating refresh tokens.
+
+/login/ hands out a refresh token next to the access token. /refresh/ trades
+it for a new access token and a new refresh token without a password check.
+Each refresh token works once. Presenting a rotated one again means it
+leaked, so its whole family (every token descended from the same login) is
+revoked.
+"""
+import hashlib
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from login_db.enums import UserStatus
+from login_db.models import User
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.logger import get_logger
+from api.models import RefreshToken, RefreshTokenStatus
+from api.writer import token_writer
+
+logger = get_logger(__name__)
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def issue_refresh_token(user_id: int, session: AsyncSession, family_id: Optional[str] = None) -> str:
+    """Store a new refresh token (in a new family unless one is given).
+
+    With write-behind on, the row joins the access token in the next batch;
+    otherwise it is added to `session` and committed.
+    """
+    token = secrets.token_urlsafe(32)
+    row = {"token_hash": hash_refresh_token(token),
+           "family_id": family_id or uuid.uuid4().hex,
+           "user_id": user_id,
+           "status": RefreshTokenStatus.ACTIVE,
+           "expiration_time": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+           "created_at": datetime.utcnow()}
+    if token_writer.running:
+        token_writer.insert(row, model=RefreshToken, key=row["token_hash"])
+        return token
+    session.add(RefreshToken(**row))
+    await session.commit()
+    return token
+
+
+async def flush_pending(token_hash: Optional[str] = None):
+    """Write buffered refresh tokens (all, or only if `token_hash` is one) before a query reads them."""
+    if token_writer.running and (token_hash is None or token_writer.is_pending(token_hash)):
+        await token_writer.flush()
+
+
+async def revoke_family(family_id: str, session: AsyncSession):
+    await flush_pending()
+    await session.execute(update(RefreshToken)
+                          .where(RefreshToken.family_id == family_id,
+                                 RefreshToken.status != RefreshTokenStatus.REVOKED)
+                          .values(status=RefreshTokenStatus.REVOKED))
+    await session.commit()
+
+
+async def revoke_user_refresh_tokens(user_ids: list, session: AsyncSession) -> int:
+    """Revoke every live refresh token of the given users, e.g. on logout-all or a password reset. The caller commits."""
+    await flush_pending()
+    result = await session.execute(update(RefreshToken)
+                                   .where(RefreshToken.user_id.in_(user_ids),
+                                          RefreshToken.status == RefreshTokenStatus.ACTIVE)
+                                   .values(status=RefreshTokenStatus.REVOKED))
+    return result.rowcount
+
+
+async def rotate_refresh_token(token: str, session: AsyncSession) -> Optional[tuple]:
+    """Mark `token` used and return (user_id, new refresh token), or None if it cannot be used."""
+    token_hash = hash_refresh_token(token)
+    await flush_pending(token_hash)
+    stored = await session.scalar(select(RefreshToken)
+                                  .where(RefreshToken.token_hash == token_hash))
+    if stored is None or stored.expiration_time <= datetime.utcnow():
+        return None
+    if stored.status == RefreshTokenStatus.USED:
+        logger.warning("Refresh token reused, revoking family %s of user %s", stored.family_id, stored.user_id)
+        await revoke_family(stored.family_id, session)
+        return None
+    if stored.status != RefreshTokenStatus.ACTIVE:
+        return None
+
+    user = await session.get(User, stored.user_id)
+    if user is None or user.status != UserStatus.ACTIVE:
+        await revoke_family(stored.family_id, session)
+        return None
+
+    # Conditional so that of two concurrent rotations only one wins; the
+    # loser is treated like a reuse.
+    result = await session.execute(update(RefreshToken)
+                                   .where(RefreshToken.id == stored.id,
+                                          RefreshToken.status == RefreshTokenStatus.ACTIVE)
+                                   .values(status=RefreshTokenStatus.USED))
+    if result.rowcount != 1:
+        logger.warning("Concurrent refresh token rotation, revoking family %s", stored.family_id)
+        await revoke_family(stored.family_id, session)
+        return None
+    new_token = await issue_refresh_token(stored.user_id, session, family_id=stored.family_id)
+    if token_writer.running:
+        # The successor was buffered, so nothing committed marking this one used
+        await session.commit()
+    return stored.user_id, new_token
+
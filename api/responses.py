@@ -0,0 +1,24 @@
+import typing
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.responses import Response
+
+from api.metrics import timed
+
+
+class JSONResponse(ORJSONResponse):
+    """orjson-backed JSONResponse that records how long rendering the body takes."""
+
+    def render(self, content: typing.Any) -> bytes:
+        with timed("serialization"):
+            return super().render(content)
+
+
+class PreEncodedJSONResponse(Response):
+    """Response for a body encoded once with `encode`, so nothing is serialized per request."""
+    media_type = "application/json"
+
+
+def encode(content: typing.Any) -> bytes:
+    return orjson.dumps(content)
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from jose import JWTError
+from login_db.enums import TokenStatus, TokenType
+from login_db.models import Token
+from sqlalchemy import select
+
+from api.cache import to_timestamp
+from api.keys import key_ring
+from api.logger import get_logger
+from api.metrics import timed
+
+logger = get_logger(__name__)
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+
+
+class RevocationList:
+    """Compact set of revoked, not yet expired access tokens.
+
+    Tokens are stored as 16-byte digests mapped to their expiration timestamp,
+    so the set only ever holds tokens that could still pass signature and exp
+    checks.
+    """
+
+    def __init__(self):
+        self._revoked = {}
+        self._recent = {}
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()[:16]
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, token: str, expires_at: float):
+        digest = self._digest(token)
+        self._revoked[digest] = expires_at
+        self._recent[digest] = (expires_at, time.time())
+
+    def is_revoked(self, token: str) -> bool:
+        return self._digest(token) in self._revoked
+
+    def replace(self, tokens: dict, started_at: float):
+        """Swap in a fresh snapshot of {token: expires_at} read from the database.
+
+        Tokens added locally after the snapshot query started may not be in it
+        yet, so they are carried over.
+        """
+        now = time.time()
+        revoked = {self._digest(token): expires_at for token, expires_at in tokens.items()}
+        recent = {}
+        for digest, (expires_at, added_at) in self._recent.items():
+            if added_at >= started_at and expires_at > now:
+                revoked[digest] = expires_at
+                recent[digest] = (expires_at, added_at)
+        self._revoked = {digest: exp for digest, exp in revoked.items() if exp > now}
+        self._recent = recent
+
+
+revocation_list = RevocationList()
+
+
+def is_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+def verify_access_token(token: str) -> bool:
+    """Check signature, exp and revocation without touching the database."""
+    try:
+        with timed("jwt_decode"):
+            key_ring.decode(token)
+    except JWTError:
+        return False
+    return not revocation_list.is_revoked(token)
+
+
+async def refresh_revocations(session_factory):
+    started_at = time.time()
+    async with session_factory() as session:
+        rows = await session.execute(select(Token.token, Token.expiration_time).where(
+            Token.type == TokenType.ACCESS,
+            Token.status != TokenStatus.ACTIVE,
+            Token.expiration_time > datetime.utcnow(),
+        ))
+        tokens = {token: to_timestamp(expiration_time) for token, expiration_time in rows}
+    revocation_list.replace(tokens, started_at)
+
+
+async def run_revocation_refresher(session_factory, interval: float = REVOCATION_REFRESH_SECONDS):
+    while True:
+        try:
+            await refresh_revocations(session_factory)
+        except Exception:
+            logger.exception("Revocation refresh failed")
+        await asyncio.sleep(interval)
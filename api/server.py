@@ -0,0 +1,51 @@
+"""Production entry point: one uvicorn worker process per core.
+
+    python -m api.server --host 0.0.0.0 --port 8000
+
+On SIGTERM the workers stop accepting connections, let in-flight requests
+finish for up to GRACEFUL_SHUTDOWN_SECONDS, then run the lifespan shutdown
+(flushing buffered token writes and queued emails). Set SHARED_STATE_PATH so
+rate limits and token revocations are shared between the workers.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+GRACEFUL_SHUTDOWN_SECONDS = float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+# Comma-separated proxy addresses (or "*") whose X-Forwarded-For is trusted for
+# the client IP. Without it every client behind a load balancer shares one
+# per-IP rate limit.
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Inherited by the worker processes before they set up logging
+        os.environ["LOG_FILE_PER_PROCESS"] = "true"
+    if args.workers > 1 and not os.getenv("SHARED_STATE_PATH"):
+        logger.warning("Running %d workers without SHARED_STATE_PATH: rate limits and revocations are per worker",
+                       args.workers)
+    uvicorn.run("api.main:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+                proxy_headers=True,
+                forwarded_allow_ips=TRUSTED_PROXIES,
+                timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
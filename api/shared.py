@@ -0,0 +1,177 @@
+"""State shared by the worker processes of one host, kept in a SQLite file.
+
+Point SHARED_STATE_PATH at a file on tmpfs (e.g. /dev/shm/login-api.db) and
+every worker started by api.server uses it for:
+
+- rate-limit and lockout counters (it implements the RateLimitStore methods)
+- token cache entries (api.cache.SharedStoreBackend), so a token validated
+  by one worker is not looked up again by the others
+- an invalidation log: each revoked or used token is appended once and
+  every worker replays new entries into its token cache and revocation list
+  every SHARED_SYNC_SECONDS.
+
+Each call is a single short SQLite statement on a local file, so it is
+made directly from the event loop. A call waits at most
+SHARED_BUSY_TIMEOUT_MS for another worker's lock. Past that, cache and
+invalidation calls fail open (reads miss, writes are skipped), while counter
+calls raise SharedStateUnavailableError so the rate limiter can count in
+process memory instead of reading 0 and letting everything through.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from api.exceptions import SharedStateUnavailableError
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH")
+SHARED_SYNC_SECONDS = float(os.getenv("SHARED_SYNC_SECONDS", "0.5"))
+# Longest a call blocks the event loop waiting for a lock held by another worker
+SHARED_BUSY_TIMEOUT_MS = float(os.getenv("SHARED_BUSY_TIMEOUT_MS", "5"))
+# Log entries older than this are purged; workers sync far more often
+SHARED_EVENT_RETENTION_SECONDS = float(os.getenv("SHARED_EVENT_RETENTION_SECONDS", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value REAL NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT NOT NULL,
+    revoked_access INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteSharedStore:
+    def __init__(self, path: str, busy_timeout_ms: float = SHARED_BUSY_TIMEOUT_MS):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.failures = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.executescript(SCHEMA)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        """Rows of `sql`. Raises SharedStateUnavailableError if the file stayed locked past the busy timeout."""
+        try:
+            with self._lock:
+                return self._connection().execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            self.failures += 1
+            logger.warning("Shared state unavailable: %s", e)
+            raise SharedStateUnavailableError(str(e)) from e
+
+    def _execute_or_skip(self, sql: str, params: tuple = ()) -> list:
+        """Rows of `sql`, or [] if the file is unavailable."""
+        try:
+            return self._execute(sql, params)
+        except SharedStateUnavailableError:
+            return []
+
+    ########## Rate-limit counters ##########
+
+    def get(self, key: str) -> float:
+        rows = self._execute("SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time()))
+        return rows[0][0] if rows else 0
+
+    def incr(self, key: str, ttl: float) -> float:
+        now = time.time()
+        # Atomic across processes: an expired counter restarts at 1 with a new deadline
+        rows = self._execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, 1, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN 1 ELSE value + 1 END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, now + ttl, now, now),
+        )
+        return rows[0][0]
+
+    def set(self, key: str, value: float, ttl: float):
+        self._execute("INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                      (key, value, time.time() + ttl))
+
+    def delete(self, key: str):
+        self._execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def clear(self):
+        self._execute("DELETE FROM counters")
+
+    ########## Cache entries ##########
+
+    def cache_get(self, key: str) -> Optional[tuple]:
+        rows = self._execute_or_skip("SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+                                     (key, time.time()))
+        return rows[0] if rows else None
+
+    def cache_set(self, key: str, value: str, expires_at: float):
+        self._execute_or_skip("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                              (key, value, expires_at))
+
+    def cache_delete(self, key: str):
+        self._execute_or_skip("DELETE FROM cache WHERE key = ?", (key,))
+
+    ########## Invalidation log ##########
+
+    def publish(self, token: str, expires_at: float, revoked_access: bool):
+        self._execute_or_skip("INSERT INTO invalidations (token, revoked_access, expires_at, created_at) "
+                              "VALUES (?, ?, ?, ?)",
+                              (token, int(revoked_access), expires_at, time.time()))
+
+    def last_event_id(self) -> int:
+        rows = self._execute_or_skip("SELECT COALESCE(MAX(id), 0) FROM invalidations")
+        return rows[0][0] if rows else 0
+
+    def events_since(self, last_id: int) -> list:
+        """(id, token, revoked_access, expires_at) for every entry after `last_id`."""
+        return self._execute_or_skip("SELECT id, token, revoked_access, expires_at FROM invalidations "
+                                     "WHERE id > ? ORDER BY id", (last_id,))
+
+    def purge(self):
+        now = time.time()
+        self._execute_or_skip("DELETE FROM counters WHERE expires_at <= ?", (now,))
+        self._execute_or_skip("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        self._execute_or_skip("DELETE FROM invalidations WHERE created_at < ?", (now - SHARED_EVENT_RETENTION_SECONDS,))
+
+
+async def run_shared_sync(store: SQLiteSharedStore, apply, interval: float = SHARED_SYNC_SECONDS):
+    """Replay invalidations published by any worker through `apply(token, revoked_access, expires_at)`."""
+    last_id = store.last_event_id()
+    last_purge = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for event_id, token, revoked_access, expires_at in store.events_since(last_id):
+                apply(token, bool(revoked_access), expires_at)
+                last_id = event_id
+            if time.monotonic() - last_purge > SHARED_EVENT_RETENTION_SECONDS / 10:
+                store.purge()
+                last_purge = time.monotonic()
+        except Exception:
+            logger.exception("Shared state sync failed")
+
+
+shared_store = SQLiteSharedStore(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
@@ -0,0 +1,110 @@
+"""Startup warm-up so the first requests after a deploy do not pay for cold resources.
+
+Opens pooled connections and runs the hot token/user queries on each of
+them, starts every hash worker thread with a dummy verify, and exercises
+JWT encode/decode. The worker reports ready on /healthz only afterwards.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from login_db.enums import TokenStatus
+from login_db.models import Token, User
+from sqlalchemy import or_, select, text
+
+from api.database import DB_POOL_SIZE
+from api.keys import key_ring
+from api.logger import get_logger
+from api.passwords import hash_password, verify_password
+from api.workers import hash_executor
+
+logger = get_logger(__name__)
+
+# Taken when the module is first imported, i.e. early in worker startup
+PROCESS_STARTED = time.monotonic()
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Connections opened up front, at most the pool size so none are thrown away
+WARMUP_CONNECTIONS = min(int(os.getenv("WARMUP_CONNECTIONS", "5")), DB_POOL_SIZE)
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+# Startup waits this long for warm-up, then serves while warm-up keeps retrying
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+
+# Same statement shapes the routes issue, so their compiled forms are cached
+WARMUP_QUERIES = [
+    select(Token).where(Token.token == "warmup", Token.expiration_time > datetime(1970, 1, 1)),
+    select(Token).where(Token.token == "warmup", Token.status == TokenStatus.ACTIVE),
+    select(User).where(or_(User.username == "warmup", User.email == "warmup")),
+]
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.cold_start_seconds = None
+        self.steps = {}
+
+    def mark_ready(self, steps: dict):
+        self.steps = steps
+        self.cold_start_seconds = time.monotonic() - PROCESS_STARTED
+        self.ready = True
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "cold_start_ms": round(self.cold_start_seconds * 1000, 1) if self.cold_start_seconds else None,
+            "warmup_ms": {step: round(seconds * 1000, 1) for step, seconds in self.steps.items()},
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_connections(engine, count: int):
+    async def warm_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            for query in WARMUP_QUERIES:
+                await conn.execute(query)
+
+    # Held concurrently so the pool really opens `count` distinct connections
+    await asyncio.gather(*(warm_one() for _ in range(count)))
+
+
+async def warm_hashing():
+    hashed = await hash_executor.run(hash_password, "warmup")
+    await asyncio.gather(*(hash_executor.run(verify_password, "warmup", hashed)
+                           for _ in range(hash_executor.max_workers)))
+
+
+def warm_jwt():
+    key_ring.decode(key_ring.encode({"sub": "0", "exp": datetime.utcnow() + timedelta(minutes=1)}))
+
+
+async def warm_up(engine, connections: int = WARMUP_CONNECTIONS) -> dict:
+    """Run every warm-up step and return how long each took, in seconds."""
+    steps = {}
+    for name, step in [
+        ("db_connections", lambda: warm_connections(engine, connections)),
+        ("password_hash", warm_hashing),
+        ("jwt", lambda: asyncio.to_thread(warm_jwt)),
+    ]:
+        start = time.monotonic()
+        await step()
+        steps[name] = time.monotonic() - start
+    return steps
+
+
+async def run_warmup(engine, retry_interval: float = WARMUP_RETRY_SECONDS):
+    """Warm up until it succeeds, e.g. while the database is still coming up, then mark ready."""
+    while True:
+        try:
+            steps = await warm_up(engine) if WARMUP_ENABLED else {}
+            break
+        except Exception:
+            logger.exception("Warm-up failed, retrying in %.0fs", retry_interval)
+            await asyncio.sleep(retry_interval)
+    readiness.mark_ready(steps)
+    logger.info("Worker ready, cold start took %.0f ms", readiness.cold_start_seconds * 1000,
+                extra={"warmup_ms": readiness.status()["warmup_ms"]})
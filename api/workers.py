@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api.exceptions import OverloadedError
+
+# bcrypt releases the GIL while hashing, so a thread pool gives real parallelism
+# without having to pickle sessions or arguments for a process pool.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+
+
+class BoundedExecutor:
+    """Thread pool with a bounded backlog.
+
+    At most `max_workers` calls run at the same time and at most `queue_size`
+    more wait for a free worker. Anything beyond that raises OverloadedError
+    right away instead of piling up behind the event loop.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, thread_name_prefix: str = "worker"):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=self.thread_name_prefix)
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_size:
+                raise OverloadedError(f"{self.thread_name_prefix} pool is full.")
+            self._pending += 1
+
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        # Release the slot when the worker is done, not when the caller stops
+        # waiting, so a cancelled request cannot free a slot that is still busy.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+hash_executor = BoundedExecutor(max_workers=HASH_WORKERS,
+                                queue_size=HASH_QUEUE_SIZE,
+                                thread_name_prefix="hash")
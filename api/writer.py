@@ -0,0 +1,223 @@
+import asyncio
+import os
+from collections import defaultdict
+
+from login_db.models import Token
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from api.database import AsyncSessionLocal
+from api.exceptions import OverloadedError
+from api.logger import get_logger
+
+logger = get_logger(__name__)
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_BATCH_INTERVAL = float(os.getenv("WRITE_BATCH_INTERVAL", "0.05"))
+WRITE_BUFFER_MAX = int(os.getenv("WRITE_BUFFER_MAX", "10000"))
+# Failed attempts after which a write is dropped, so one bad row cannot block the buffer
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "10"))
+
+# Errors that retrying the same row can never fix (duplicate token, deleted user, ...)
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+
+class TokenWriter:
+    """Write-behind buffer for Token inserts and status updates.
+
+    Inserts into other tables keyed by a unique value (refresh tokens) can
+    share the buffer by passing their model and key to insert().
+
+    Writes are coalesced in memory and committed by a background task as one
+    multi-row INSERT per table plus one UPDATE per target status, either every
+    `interval` seconds or as soon as `batch_size` writes are waiting.
+
+    Callers that read a token this worker has buffered should check
+    is_pending() and await flush() first, so they see their own writes.
+
+    When a batch fails its rows are retried one by one, each in its own
+    transaction. A row failing with a permanent error, or more than
+    `max_retries` times, is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, session_factory, batch_size: int, interval: float, max_buffered: int,
+                 max_retries: int = WRITE_MAX_RETRIES):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_buffered = max_buffered
+        self.max_retries = max_retries
+        self._inserts = {}
+        self._updates = {}
+        self._attempts = {}
+        self.dropped = 0
+        self._inflight = set()
+        self._lock = None
+        self._wakeup = None
+        self._task = None
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def __len__(self) -> int:
+        return len(self._inserts) + len(self._updates)
+
+    def _check_capacity(self):
+        if len(self) >= self.max_buffered:
+            raise OverloadedError("Token write buffer is full.")
+
+    def _maybe_wake(self):
+        if len(self) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def insert(self, row: dict, model=Token, key: str = None):
+        self._check_capacity()
+        self._inserts[key or row["token"]] = (model, row)
+        self._maybe_wake()
+
+    def update_status(self, token: str, status):
+        if token in self._inserts:
+            # Not written yet, fold the update into the pending insert
+            self._inserts[token][1]["status"] = status
+            return
+        self._check_capacity()
+        self._updates[token] = status
+        self._maybe_wake()
+
+    def is_pending(self, token: str) -> bool:
+        return token in self._inserts or token in self._updates or token in self._inflight
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            inserts, self._inserts = self._inserts, {}
+            updates, self._updates = self._updates, {}
+            if not inserts and not updates:
+                return
+            self._inflight = set(inserts) | set(updates)
+            try:
+                try:
+                    await self._write(inserts, updates)
+                    self.batches += 1
+                    for token in self._inflight:
+                        self._attempts.pop(token, None)
+                    return
+                except Exception:
+                    logger.warning("Token write batch of %d failed, retrying row by row", len(self._inflight),
+                                   exc_info=True)
+                retry_inserts, retry_updates = await self._write_rows(inserts, updates)
+            except BaseException:
+                # Cancelled mid-write: keep everything, rows already written fail later as duplicates
+                self._requeue(inserts, updates)
+                raise
+            finally:
+                self._inflight = set()
+            if retry_inserts or retry_updates:
+                self._requeue(retry_inserts, retry_updates)
+                raise RuntimeError(f"{len(retry_inserts) + len(retry_updates)} token writes requeued")
+
+    async def _write(self, inserts: dict, updates: dict):
+        by_status = defaultdict(list)
+        for token, status in updates.items():
+            by_status[status].append(token)
+
+        by_model = defaultdict(list)
+        for model, row in inserts.values():
+            by_model[model].append(row)
+
+        async with self.session_factory() as session:
+            for model, rows in by_model.items():
+                await session.execute(insert(model), rows)
+            for status, tokens in by_status.items():
+                await session.execute(update(Token)
+                                      .where(Token.token.in_(tokens))
+                                      .values(status=status)
+                                      .execution_options(synchronize_session=False))
+            await session.commit()
+
+    async def _write_rows(self, inserts: dict, updates: dict) -> tuple:
+        """Write each row in its own transaction. Returns the inserts and updates to retry later."""
+        rows = [(token, {token: pending}, {}) for token, pending in inserts.items()]
+        rows += [(token, {}, {token: status}) for token, status in updates.items()]
+        retry_inserts, retry_updates = {}, {}
+        for position, (token, row_insert, row_update) in enumerate(rows):
+            try:
+                await self._write(row_insert, row_update)
+                self._attempts.pop(token, None)
+                continue
+            except PERMANENT_ERRORS as e:
+                self._drop(token, row_insert, e)
+                continue
+            except Exception as e:
+                error = e
+            # Not the row's fault, most likely the database itself: stop trying the rest
+            for token, row_insert, row_update in rows[position:]:
+                attempts = self._attempts.get(token, 0) + 1
+                if attempts >= self.max_retries:
+                    self._drop(token, row_insert, error)
+                    continue
+                self._attempts[token] = attempts
+                retry_inserts.update(row_insert)
+                retry_updates.update(row_update)
+            break
+        return retry_inserts, retry_updates
+
+    def _drop(self, token: str, row_insert: dict, error: Exception):
+        self._attempts.pop(token, None)
+        self.dropped += 1
+        _, row = row_insert.get(token, (None, None))
+        # The token itself is a credential and stays out of the log
+        logger.error("Dropping token %s for user %s: %s", "insert" if row else "status update",
+                     row["user_id"] if row else "?", error)
+
+    def _requeue(self, inserts: dict, updates: dict):
+        # Anything buffered while the batch was in flight is newer and wins
+        for token, (model, row) in inserts.items():
+            if token in self._updates:
+                row["status"] = self._updates.pop(token)
+            self._inserts.setdefault(token, (model, row))
+        for token, status in updates.items():
+            self._updates.setdefault(token, status)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Failed rows were requeued, try again on the next cycle
+                logger.exception("Token write batch failed, %d writes buffered", len(self))
+
+    def start(self):
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            # The rest of shutdown (mail, audit log, engine) must still run
+            logger.exception("Final token write flush failed, %d writes lost", len(self))
+
+
+token_writer = TokenWriter(AsyncSessionLocal,
+                           batch_size=WRITE_BATCH_SIZE,
+                           interval=WRITE_BATCH_INTERVAL,
+                           max_buffered=WRITE_BUFFER_MAX,
+                           max_retries=WRITE_MAX_RETRIES)
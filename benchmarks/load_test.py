@@ -0,0 +1,91 @@
+"""Closed-loop load test for a running API.
+
+Example:
+    python benchmarks/load_test.py --endpoint /validate-token/ \
+        --payload '{"token": "..."}' --concurrency 50 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import httpx
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int, elapsed: float, statuses: dict = None) -> dict:
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+    if statuses is not None:
+        summary["statuses"] = {str(status): count for status, count in sorted(statuses.items())}
+    return summary
+
+
+async def run_load(base_url: str, endpoint: str, payload, concurrency: int, total: int) -> dict:
+    """POST `total` requests to `endpoint` from `concurrency` clients.
+
+    `payload` is either one body sent every time or a list of bodies, one per
+    request, for endpoints that consume what they are sent (logout, reset).
+    """
+    latencies = []
+    errors = 0
+    statuses = Counter()
+    remaining = total
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            body = payload[remaining % len(payload)] if isinstance(payload, list) else payload
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=body)
+                statuses[response.status_code] += 1
+                if response.status_code >= 500:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, errors, elapsed, statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/validate-token/")
+    parser.add_argument("--payload", default='{"token": "benchmark"}')
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args.url, args.endpoint, json.loads(args.payload),
+                                  args.concurrency, args.requests))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-call cost of a log statement on the calling thread.
+
+Compares the queue-based logger from api.logger with the previous setup, a
+FileHandler called synchronously. --io-latency-ms adds a delay to every write
+to mimic a slow or contended disk:
+
+    python -m benchmarks.logging_overhead --calls 20000 --io-latency-ms 1
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+from api import logger as api_logger
+
+
+class SlowFileHandler(logging.FileHandler):
+    def __init__(self, path: str, latency: float):
+        super().__init__(path)
+        self.latency = latency
+
+    def emit(self, record: logging.LogRecord):
+        if self.latency:
+            time.sleep(self.latency)
+        super().emit(record)
+
+
+def time_calls(logger: logging.Logger, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.info("Invalid login attempt for username: %s", f"user{i}")
+    return (time.perf_counter() - start) / calls
+
+
+def measure_sync(path: str, calls: int, latency: float) -> float:
+    logger = logging.getLogger("benchmark.sync")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = SlowFileHandler(path, latency)
+    handler.setFormatter(logging.Formatter('%(asctime)s | %(name)s | %(levelname)s | %(message)s'))
+    logger.addHandler(handler)
+    try:
+        return time_calls(logger, calls)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def measure_queue(path: str, calls: int, latency: float) -> float:
+    logger = logging.getLogger("benchmark.queue")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = SlowFileHandler(path, latency)
+    handler.setFormatter(api_logger.JsonFormatter())
+    queue_handler = api_logger.DroppingQueueHandler(api_logger.queue.Queue(maxsize=calls))
+    listener = QueueListener(queue_handler.queue, handler)
+    listener.start()
+    logger.addHandler(queue_handler)
+    try:
+        return time_calls(logger, calls)
+    finally:
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--io-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    latency = args.io_latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = {
+            "sync_file_handler_us": round(measure_sync(os.path.join(directory, "sync.log"), args.calls, latency) * 1e6, 2),
+            "queue_handler_us": round(measure_queue(os.path.join(directory, "queue.log"), args.calls, latency) * 1e6, 2),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Micro-benchmarks for the expensive steps behind the endpoints.
+
+bcrypt hash/verify at several cost factors, JWT encode/decode with the
+configured algorithm, and (with --db) the token queries /validate-token/,
+/login/ and /logout/ issue, run against the database served by api.database:
+
+    ALGORITHM=ES256 JWT_KEYS_DIR=keys python -m benchmarks.micro --rounds 10,12,14 --db
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from passlib.context import CryptContext
+
+from api.keys import key_ring
+from benchmarks.load_test import summarize
+
+
+def time_calls(fn, iterations: int) -> dict:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, 0, sum(latencies))
+
+
+def bench_bcrypt(rounds: list, iterations: int) -> dict:
+    results = {}
+    for cost in rounds:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=cost)
+        hashed = context.hash("benchmark-password")
+        results[f"bcrypt_hash_{cost}"] = time_calls(lambda: context.hash("benchmark-password"), iterations)
+        results[f"bcrypt_verify_{cost}"] = time_calls(lambda: context.verify("benchmark-password", hashed), iterations)
+    return results
+
+
+def bench_jwt(iterations: int) -> dict:
+    claims = {"sub": "1", "exp": datetime.utcnow() + timedelta(minutes=30)}
+    token = key_ring.encode(claims)
+    return {
+        f"jwt_encode_{key_ring.algorithm}": time_calls(lambda: key_ring.encode(claims), iterations),
+        f"jwt_decode_{key_ring.algorithm}": time_calls(lambda: key_ring.decode(token), iterations),
+    }
+
+
+async def bench_queries(iterations: int) -> dict:
+    # Only needed with --db, so bcrypt/JWT numbers can be taken without a database
+    from login_db.enums import TokenStatus, TokenType
+    from login_db.models import Token
+    from sqlalchemy import select, update
+
+    from api.database import AsyncSessionLocal, engine
+    from benchmarks.token_lookup import get_benchmark_user
+
+    lookups, inserts, updates = [], [], []
+    async with AsyncSessionLocal() as session:
+        user_id = await get_benchmark_user(session)
+        expiration_time = datetime.utcnow() + timedelta(minutes=30)
+        for _ in range(iterations):
+            token = f"micro-{uuid.uuid4().hex}"
+
+            start = time.perf_counter()
+            session.add(Token(token=token, status=TokenStatus.ACTIVE, type=TokenType.ACCESS,
+                              expiration_time=expiration_time, user_id=user_id))
+            await session.commit()
+            inserts.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await session.scalar(select(Token).where(Token.token == token,
+                                                     Token.expiration_time > datetime.utcnow()))
+            lookups.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await session.execute(update(Token).where(Token.token == token).values(status=TokenStatus.LOGGED_OUT))
+            await session.commit()
+            updates.append(time.perf_counter() - start)
+    await engine.dispose()
+    return {
+        "token_insert": summarize(inserts, 0, sum(inserts)),
+        "token_lookup": summarize(lookups, 0, sum(lookups)),
+        "token_status_update": summarize(updates, 0, sum(updates)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", default="10,12,14", help="bcrypt cost factors")
+    parser.add_argument("--bcrypt-iterations", type=int, default=20)
+    parser.add_argument("--jwt-iterations", type=int, default=10000)
+    parser.add_argument("--db", action="store_true", help="also time the token queries")
+    parser.add_argument("--query-iterations", type=int, default=1000)
+    parser.add_argument("--output", help="write the results to this JSON file as well")
+    args = parser.parse_args()
+
+    results = bench_bcrypt([int(cost) for cost in args.rounds.split(",")], args.bcrypt_iterations)
+    results.update(bench_jwt(args.jwt_iterations))
+    if args.db:
+        results.update(asyncio.run(bench_queries(args.query_iterations)))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
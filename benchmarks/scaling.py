@@ -0,0 +1,59 @@
+"""Throughput as the number of worker processes grows.
+
+Starts api.server with each worker count on a scratch database and runs the
+suite's scenarios against it. Scaling is linear when efficiency stays near 1,
+where efficiency = throughput with N workers / (N * throughput with 1):
+
+    python -m benchmarks.scaling --workers 1,2,4,8 --scenarios login,validate-token
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from api.database import get_database_url
+from benchmarks.suite import create_tables, run_suite, spawn_server, wait_until_ready
+
+
+def efficiency(results: dict) -> dict:
+    """{scenario: {workers: throughput / (workers * single-worker throughput)}}"""
+    single = results[min(results)]
+    report = {}
+    for workers, scenarios in sorted(results.items()):
+        for name, result in scenarios.items():
+            base = single[name]["throughput_rps"]
+            report.setdefault(name, {})[workers] = round(result["throughput_rps"] / (workers * base), 2) if base else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 1}")
+    parser.add_argument("--scenarios", default="login,validate-token")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    database_url = get_database_url()
+    asyncio.run(create_tables(database_url))
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for workers in sorted({int(count) for count in args.workers.split(",")}):
+        server = spawn_server(args.port, workers)
+        try:
+            asyncio.run(wait_until_ready(base_url))
+            results[workers] = asyncio.run(run_suite(base_url, database_url, args.scenarios.split(","),
+                                                     args.concurrency, args.requests, 0, args.users))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps({"throughput_rps": {workers: {name: result["throughput_rps"] for name, result in scenarios.items()}
+                                         for workers, scenarios in results.items()},
+                      "efficiency": efficiency(results)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Load test every endpoint and store the results for comparison across commits.
+
+Starts the API on a scratch database (or targets one that is already running
+with --url), seeds benchmark users through /register/ and /login/, then drives
+each endpoint at the same concurrency. Results go to a JSON file named after
+the current commit:
+
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.suite --spawn
+    python -m benchmarks.suite --spawn --compare benchmarks/results/<baseline>.json
+
+Without DATABASE_URL the POSTGRES_* variables are used, e.g. the container
+started by `make run-db`. Never point this at production: it creates users
+and tokens and changes passwords.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from login_db.enums import TokenStatus, TokenType
+from login_db.models import Token, User
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.database import get_database_url
+from api.models import ensure_tables
+from benchmarks.load_test import run_load
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PASSWORD = "benchmark-password"
+
+# Limits that would turn a benchmark into a 429 benchmark
+SERVER_ENV = {
+    "LOGIN_RATE_LIMIT_PER_IP": "1000000000",
+    "FORGOTTEN_RATE_LIMIT_PER_IP": "1000000000",
+    "FORGOTTEN_RATE_LIMIT_PER_EMAIL": "1000000000",
+    "LOGIN_MAX_FAILURES": "0",
+    "LOG_LEVEL": "WARNING",
+}
+
+# Order matters: refresh, logout and reset-password consume tokens,
+# reset-password changes the seeded passwords
+SCENARIOS = ["login", "validate-token", "refresh", "logout", "register", "forgotten-password", "reset-password"]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def create_tables(database_url):
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Token.metadata.create_all)
+    await ensure_tables(engine)
+    await engine.dispose()
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/healthz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"API at {base_url} did not come up within {timeout}s")
+
+
+def spawn_server(port: int, workers: int = 1) -> subprocess.Popen:
+    env = {**os.environ, **SERVER_ENV}
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    env.setdefault("ALGORITHM", "HS256")
+    env.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    if workers > 1:
+        env.setdefault("SHARED_STATE_PATH", os.path.join(tempfile.gettempdir(), f"login-api-bench-{port}.db"))
+    return subprocess.Popen([sys.executable, "-m", "api.server", "--port", str(port), "--workers", str(workers)],
+                            env=env)
+
+
+async def post_all(client: httpx.AsyncClient, endpoint: str, bodies: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(body):
+        async with semaphore:
+            return await client.post(endpoint, json=body)
+
+    return await asyncio.gather(*(post(body) for body in bodies))
+
+
+async def login_tokens(client: httpx.AsyncClient, users: list, count: int, concurrency: int,
+                       field: str = "token") -> list:
+    bodies = [{"username": users[i % len(users)]["username"], "password": PASSWORD} for i in range(count)]
+    responses = await post_all(client, "/login/", bodies, concurrency)
+    tokens = [response.json()[field] for response in responses if response.status_code == 200]
+    if len(tokens) < count:
+        raise RuntimeError(f"Only {len(tokens)} of {count} benchmark logins succeeded")
+    return tokens
+
+
+async def reset_tokens(database_url, prefix: str, count: int, timeout: float = 30) -> list:
+    """Reset tokens are only emailed, so read the ones /forgotten-password/ issued from the database."""
+    engine = create_async_engine(database_url)
+    query = select(Token.token).join(User, User.id == Token.user_id).where(
+        User.username.startswith(prefix),
+        Token.type == TokenType.RESET_PASSWORD,
+        Token.status == TokenStatus.ACTIVE,
+    )
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            async with engine.connect() as conn:
+                tokens = list((await conn.scalars(query)).all())
+            if len(tokens) >= count or time.monotonic() > deadline:
+                return tokens
+            await asyncio.sleep(0.5)
+    finally:
+        await engine.dispose()
+
+
+async def run_suite(base_url: str, database_url, scenarios: list, concurrency: int,
+                    requests: int, consumable: int, users: int) -> dict:
+    prefix = f"bench_{int(time.time())}_"
+    seeded = [{"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "password": PASSWORD}
+              for i in range(users)]
+    results = {}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        responses = await post_all(client, "/register/", seeded, concurrency)
+        if any(response.status_code != 200 for response in responses):
+            raise RuntimeError("Registering benchmark users failed")
+
+        for name in scenarios:
+            endpoint = f"/{name}/"
+            total = requests
+            if name == "login":
+                payload = [{"username": user["username"], "password": PASSWORD} for user in seeded]
+            elif name == "validate-token":
+                payload = [{"token": token} for token in await login_tokens(client, seeded, users, concurrency)]
+            elif name == "refresh":
+                total = consumable
+                tokens = await login_tokens(client, seeded, total, concurrency, field="refresh_token")
+                payload = [{"refresh_token": token} for token in tokens]
+            elif name == "logout":
+                total = consumable
+                payload = [{"token": token} for token in await login_tokens(client, seeded, total, concurrency)]
+            elif name == "register":
+                payload = [{"username": f"{prefix}r{i}", "email": f"{prefix}r{i}@example.com", "password": PASSWORD}
+                           for i in range(total)]
+            elif name == "forgotten-password":
+                payload = [{"email": user["email"]} for user in seeded]
+            elif name == "reset-password":
+                if database_url is None:
+                    print("Skipping reset-password: reset tokens can only be read with database access")
+                    continue
+                total = min(consumable, users)
+                await post_all(client, "/forgotten-password/",
+                               [{"email": user["email"]} for user in seeded[:total]], concurrency)
+                tokens = (await reset_tokens(database_url, prefix, total))[:total]
+                total = len(tokens)
+                payload = [{"token": token, "password": PASSWORD} for token in tokens]
+            else:
+                raise ValueError(f"Unknown scenario: {name}")
+
+            results[name] = await run_load(base_url, endpoint, payload, concurrency, total)
+            print(f"{name}: {json.dumps(results[name])}")
+
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Scenarios whose p95 latency rose or throughput fell by more than `threshold` (0.1 = 10%)."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if before["throughput_rps"] and result["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--spawn", action="store_true", help="start the API on --port and create tables first")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for --spawn")
+    parser.add_argument("--no-db", action="store_true", help="no direct database access (skips reset-password)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--consumable", type=int, default=200,
+                        help="requests for logout and reset-password, each needs a fresh token")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--output", help="defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="baseline results file; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    database_url = None if args.no_db else get_database_url()
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    base_url = args.url
+    server = None
+    if args.spawn:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(create_tables(database_url or get_database_url()))
+        server = spawn_server(args.port, args.workers)
+    try:
+        if server is not None:
+            asyncio.run(wait_until_ready(base_url))
+        scenario_results = asyncio.run(run_suite(base_url, database_url, scenarios, args.concurrency,
+                                                 args.requests, args.consumable, args.users))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {"concurrency": args.concurrency, "requests": args.requests, "workers": args.workers,
+                   "consumable": args.consumable, "users": args.users,
+                   "database": make_url(get_database_url()).get_backend_name()},
+        "scenarios": scenario_results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Token lookup latency as the Token table grows.
+
+Fills the table served by api.database up to each requested size and times the
+exact lookup /validate-token/ issues against random existing tokens. Run
+against a scratch database, never production:
+
+    python -m benchmarks.token_lookup --sizes 1000000,10000000,30000000 --lookups 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from login_db.enums import TokenStatus, TokenType, UserStatus
+from login_db.models import Token, User
+from sqlalchemy import func, insert, literal, select, text
+
+from api.database import AsyncSessionLocal, engine
+from api.passwords import hash_password
+from benchmarks.load_test import summarize
+
+TOKEN_PREFIX = "bench-"
+FILL_BATCH = 1_000_000
+
+
+async def get_benchmark_user(session) -> int:
+    user_id = await session.scalar(select(User.id).where(User.username == "benchmark_user"))
+    if user_id is None:
+        user = User(username="benchmark_user",
+                    email="benchmark@example.com",
+                    password=hash_password("benchmark"),
+                    status=UserStatus.ACTIVE)
+        session.add(user)
+        await session.commit()
+        user_id = user.id
+    return user_id
+
+
+async def count_tokens(session) -> int:
+    return await session.scalar(select(func.count()).select_from(Token).where(Token.token.startswith(TOKEN_PREFIX)))
+
+
+async def fill(session, user_id: int, start: int, stop: int):
+    """Insert active tokens bench-<start> .. bench-<stop - 1> in batches of FILL_BATCH."""
+    expiration_time = datetime.utcnow() + timedelta(days=1)
+    while start < stop:
+        end = min(stop, start + FILL_BATCH)
+        series = func.generate_series(start, end - 1).table_valued("n")
+        await session.execute(insert(Token).from_select(
+            ["user_id", "token", "type", "status", "expiration_time"],
+            select(literal(user_id),
+                   literal(TOKEN_PREFIX) + series.c.n.cast(Token.token.type),
+                   literal(TokenType.ACCESS, Token.type.type),
+                   literal(TokenStatus.ACTIVE, Token.status.type),
+                   literal(expiration_time)).select_from(series),
+        ))
+        await session.commit()
+        start = end
+    await session.execute(text(f"ANALYZE {Token.__tablename__}"))
+    await session.commit()
+
+
+async def time_lookups(session, size: int, lookups: int) -> dict:
+    latencies = []
+    for _ in range(lookups):
+        token = f"{TOKEN_PREFIX}{random.randrange(size)}"
+        start = time.perf_counter()
+        await session.scalar(select(Token).where(Token.token == token,
+                                                 Token.expiration_time > datetime.utcnow()))
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, 0, sum(latencies))
+
+
+async def run(sizes: list, lookups: int) -> list:
+    results = []
+    async with AsyncSessionLocal() as session:
+        user_id = await get_benchmark_user(session)
+        current = await count_tokens(session)
+        for size in sizes:
+            if size > current:
+                await fill(session, user_id, current, size)
+                current = size
+            result = await time_lookups(session, size, lookups)
+            result["table_rows"] = size
+            results.append(result)
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000,10000000")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    print(json.dumps(asyncio.run(run(sizes, args.lookups)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""In-process cost of one /validate-token/ call, without network or database.
+
+Calls the ASGI app directly with a token already in the token cache, so the
+number is routing, body parsing/validation, the handler and response
+serialization. Compare it before and after changes to those layers:
+
+    python -m benchmarks.validate_token --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from login_db.enums import TokenStatus
+
+from api.cache import token_cache
+from api.main import app
+from benchmarks.load_test import summarize
+
+TOKEN = "benchmark-token"
+
+
+async def call(body: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/validate-token/",
+        "raw_path": b"/validate-token/",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(requests: int) -> dict:
+    token_cache.set(TOKEN, TokenStatus.ACTIVE.name, expires_at=datetime.utcnow() + timedelta(hours=1))
+    body = json.dumps({"token": TOKEN}).encode()
+    for _ in range(200):
+        assert await call(body) == 200
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call(body)
+        latencies.append(time.perf_counter() - start)
+    result = summarize(latencies, 0, sum(latencies))
+    result["mean_us"] = round(sum(latencies) / len(latencies) * 1e6, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
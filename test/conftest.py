@@ -0,0 +1,33 @@
+import pytest
+
+from api.cache import negative_cache, token_cache
+from api.database import get_session
+from api.main import app
+from api.principals import user_cache
+from api.ratelimit import rate_limit_store
+
+
+@pytest.fixture
+def mock_session(mocker):
+    """Replace the get_session dependency and AsyncSessionLocal with an AsyncMock session."""
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    app.dependency_overrides[get_session] = lambda: session
+    session_factory = mocker.MagicMock()
+    session_factory.return_value.__aenter__.return_value = session
+    mocker.patch("api.main.AsyncSessionLocal", session_factory)
+    yield session
+    app.dependency_overrides.pop(get_session, None)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    token_cache.clear()
+    negative_cache.clear()
+    user_cache.clear()
+    rate_limit_store.clear()
+    yield
+    token_cache.clear()
+    negative_cache.clear()
+    user_cache.clear()
+    rate_limit_store.clear()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import time
+
+from api.audit import AuditLog, main, scan
+from api.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def create_audit_log(tmp_path, **kwargs):
+    options = {"max_buffered": 100, "batch_size": 10, "interval": 60, "rotate_seconds": 3600}
+    options.update(kwargs)
+    return AuditLog(str(tmp_path), **options)
+
+
+def test_record_and_flush_appends_ndjson(tmp_path):
+    audit_log = create_audit_log(tmp_path)
+    audit_log.record("login_failed", ip="1.2.3.4", username="alice")
+    audit_log.record("login", ip="1.2.3.4", user_id=1)
+    asyncio.run(audit_log.flush())
+    audit_log.record("password_reset", user_id=1)
+    asyncio.run(audit_log.flush())
+
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    with open(tmp_path / files[0], "rb") as file:
+        events = [json.loads(line) for line in file]
+    assert [event["event"] for event in events] == ["login_failed", "login", "password_reset"]
+    assert audit_log.written == 3
+
+
+def test_full_buffer_drops_events(tmp_path):
+    audit_log = create_audit_log(tmp_path, max_buffered=2)
+    assert audit_log.record("login")
+    assert audit_log.record("login")
+    assert not audit_log.record("login")
+    assert audit_log.dropped == 1
+    assert len(audit_log) == 2
+
+
+def test_background_task_flushes_full_batch(tmp_path):
+    audit_log = create_audit_log(tmp_path, batch_size=3)
+
+    async def run():
+        audit_log.start()
+        for _ in range(3):
+            audit_log.record("login")
+        await asyncio.sleep(0.1)
+        written = audit_log.written
+        await audit_log.stop()
+        return written
+
+    assert asyncio.run(run()) == 3
+
+
+def test_scan_filters_time_range_and_event(tmp_path):
+    audit_log = create_audit_log(tmp_path, rotate_seconds=60)
+    now = time.time()
+    audit_log._write([{"ts": now - 7200, "event": "login"},
+                      {"ts": now - 10, "event": "login_failed"},
+                      {"ts": now - 5, "event": "login"}])
+
+    assert [json.loads(line)["ts"] for line in scan(str(tmp_path), now - 60, now)] == [now - 10, now - 5]
+    assert len(list(scan(str(tmp_path), 0, now, events={"login"}))) == 2
+    assert list(scan(str(tmp_path / "missing"), 0, now)) == []
+
+
+def test_cli_exports_csv(tmp_path, capsys):
+    audit_log = create_audit_log(tmp_path)
+    audit_log._write([{"ts": 1700000000.0, "event": "login_failed", "ip": "1.2.3.4", "username": "alice"}])
+
+    main(["--dir", str(tmp_path), "--since", "2023-11-14", "--format", "csv"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "ts,event,ip,user_id,username,email,detail"
+    assert out[1].startswith("2023-11-14T22:13:20+00:00,login_failed,1.2.3.4,,alice")
+
+
+def test_failed_login_is_audited(mocker):
+    record = mocker.patch("api.main.audit_log.record")
+    mocker.patch("api.main.authenticate_user", return_value=None)
+
+    response = client.post("/login/", json={"username": "alice", "password": "wrong"})
+    assert response.status_code == 400
+    assert record.call_args.args == ("login_failed",)
+    assert record.call_args.kwargs["username"] == "alice"
@@ -0,0 +1,23 @@
+from benchmarks.load_test import percentile, summarize
+from benchmarks.suite import compare
+
+
+def test_summarize_reports_percentiles_and_statuses():
+    latencies = [i / 1000 for i in range(1, 101)]
+    result = summarize(latencies, errors=2, elapsed=2.0, statuses={200: 100, 500: 2})
+    assert result["requests"] == 102
+    assert result["throughput_rps"] == 50.0
+    assert result["p50_ms"] == percentile(latencies, 50) * 1000
+    assert result["p99_ms"] == 99.0
+    assert result["statuses"] == {"200": 100, "500": 2}
+
+def test_compare_flags_regressions_above_threshold():
+    baseline = {"scenarios": {"login": {"p95_ms": 100.0, "throughput_rps": 200.0},
+                              "logout": {"p95_ms": 10.0, "throughput_rps": 1000.0}}}
+    current = {"scenarios": {"login": {"p95_ms": 105.0, "throughput_rps": 150.0},
+                             "logout": {"p95_ms": 20.0, "throughput_rps": 1000.0},
+                             "register": {"p95_ms": 50.0, "throughput_rps": 10.0}}}
+    regressions = compare(baseline, current, threshold=0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("login: throughput")
+    assert regressions[1].startswith("logout: p95")
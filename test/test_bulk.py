@@ -0,0 +1,94 @@
+import json
+
+from login_db.enums import TokenType
+from login_db.models import TokenStatus
+from api.cache import token_cache
+from api.exceptions import OverloadedError
+from api.main import app
+from fastapi.testclient import TestClient
+
+
+client = TestClient(app)
+ADMIN_HEADERS = {"X-Admin-Key": "admin_key"}
+
+def create_user_row(i):
+    return {"username": f"user{i}", "email": f"user{i}@test.com", "password": "pw_test"}
+
+def test_bulk_register_requires_admin_key(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    response = client.post("/register/bulk/", json=[create_user_row(0)], headers={"X-Admin-Key": "wrong"})
+    assert response.status_code == 403
+
+def test_bulk_register_disabled_without_admin_key(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", None)
+    response = client.post("/register/bulk/", json=[create_user_row(0)], headers=ADMIN_HEADERS)
+    assert response.status_code == 403
+
+def test_bulk_register_array_reports_failed_rows(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    insert_users = mocker.patch("api.main.insert_users", return_value={1: "Username or email already exists."})
+
+    rows = [create_user_row(0), create_user_row(1), {"username": "bad", "email": "not-an-email", "password": "pw"},
+            create_user_row(3)]
+    response = client.post("/register/bulk/", json=rows, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 2
+    assert [failure["index"] for failure in response.json()["failed"]] == [1, 2]
+    assert response.json()["failed"][1]["error"].startswith("email: ")
+    assert insert_users.await_count == 1
+    assert [row["username"] for row in insert_users.call_args.args[0]] == ["user0", "user1", "user3"]
+
+def test_bulk_register_ndjson_in_chunks(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    mocker.patch("api.main.BULK_CHUNK_SIZE", 2)
+    insert_users = mocker.patch("api.main.insert_users", return_value={})
+
+    body = "\n".join(json.dumps(create_user_row(i)) for i in range(5)) + "\n{broken\n"
+    response = client.post("/register/bulk/", content=body,
+                           headers={**ADMIN_HEADERS, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 5, "failed": [{"index": 5, "error": "Row is not a JSON object."}]}
+    assert insert_users.await_count == 3
+
+def test_bulk_register_never_echoes_passwords(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    mocker.patch("api.main.insert_users", return_value={})
+
+    response = client.post("/register/bulk/", json=[{"username": "bad", "password": "secret_pw"}], headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert "secret_pw" not in response.text
+    assert response.json()["failed"] == [{"index": 0, "error": "email: Field required"}]
+
+def test_bulk_register_overloaded_keeps_partial_report(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    mocker.patch("api.main.BULK_CHUNK_SIZE", 2)
+    mocker.patch("api.main.insert_users", side_effect=[{}, OverloadedError("hash pool is full.")])
+
+    response = client.post("/register/bulk/", json=[create_user_row(i) for i in range(5)], headers=ADMIN_HEADERS)
+    assert response.status_code == 503
+    assert response.json()["inserted"] == 2
+    assert [failure["index"] for failure in response.json()["failed"]] == [2, 3]
+
+def test_bulk_register_too_many_rows(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    mocker.patch("api.main.BULK_MAX_ROWS", 2)
+    insert_users = mocker.patch("api.main.insert_users", return_value={})
+
+    response = client.post("/register/bulk/", json=[create_user_row(i) for i in range(3)], headers=ADMIN_HEADERS)
+    assert response.status_code == 413
+    assert insert_users.await_count == 0
+
+def test_admin_revoke_tokens(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    mock_session.execute.return_value = [(1, "user1", "user1@test.com")]
+    revoke_user_tokens = mocker.patch("api.main.revoke_user_tokens",
+                                      return_value=[("token_a", TokenType.ACCESS, None)])
+    revoke_user_refresh_tokens = mocker.patch("api.main.revoke_user_refresh_tokens", return_value=1)
+    token_cache.set("token_a", TokenStatus.ACTIVE.name)
+
+    response = client.post("/admin/revoke-tokens/", json={"users": ["user1", "ghost"]}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"revoked": 1, "unknown": ["ghost"]}
+    assert revoke_user_tokens.call_args.args[0] == [1]
+    assert revoke_user_refresh_tokens.call_args.args[0] == [1]
+    assert token_cache.get("token_a") is None
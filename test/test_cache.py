@@ -0,0 +1,76 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from api.cache import SharedStoreBackend, TTLCache, to_timestamp
+from api.shared import SQLiteSharedStore, run_shared_sync
+
+
+def test_cache_hit_and_miss():
+    cache = TTLCache(max_size=10, ttl=60)
+    assert cache.get("token") is None
+    cache.set("token", "ACTIVE", expires_at=datetime.utcnow() + timedelta(minutes=5))
+    assert cache.get("token") == "ACTIVE"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_never_outlives_token():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("expired", "ACTIVE", expires_at=datetime.utcnow() - timedelta(seconds=1))
+    assert cache.get("expired") is None
+
+    cache.set("short", "ACTIVE", expires_at=datetime.utcnow() + timedelta(seconds=5))
+    _, deadline = cache._entries["short"]
+    cache.set("long", "ACTIVE", expires_at=datetime.utcnow() + timedelta(days=1))
+    _, long_deadline = cache._entries["long"]
+    assert deadline < long_deadline
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", "ACTIVE")
+    cache.set("b", "ACTIVE")
+    cache.get("a")
+    cache.set("c", "ACTIVE")
+    assert cache.get("b") is None
+    assert cache.get("a") == "ACTIVE"
+    assert cache.stats()["evictions"] == 1
+
+
+def create_worker_caches(tmp_path):
+    """Token caches of two workers sharing one SQLite file."""
+    path = str(tmp_path / "shared.db")
+    stores = [SQLiteSharedStore(path), SQLiteSharedStore(path)]
+    return stores, [TTLCache(max_size=10, ttl=60, shared=SharedStoreBackend(store)) for store in stores]
+
+
+def test_shared_hit_keeps_token_deadline(tmp_path):
+    _, (worker_a, worker_b) = create_worker_caches(tmp_path)
+    worker_a.set("token", "ACTIVE", expires_at=datetime.utcnow() + timedelta(seconds=5))
+
+    assert worker_b.get("token") == "ACTIVE"
+    _, deadline = worker_b._entries["token"]
+    assert deadline <= time.time() + 5
+
+
+def test_invalidate_reaches_other_workers(tmp_path):
+    (store_a, store_b), (worker_a, worker_b) = create_worker_caches(tmp_path)
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+
+    worker_a.set("token", "ACTIVE", expires_at=expires_at)
+    assert worker_b.get("token") == "ACTIVE"
+
+    async def run():
+        # Worker a replays the invalidation log like api.main does
+        task = asyncio.create_task(run_shared_sync(store_a, lambda token, *_: worker_a.invalidate(token),
+                                                   interval=0.01))
+        await asyncio.sleep(0.03)
+        worker_b.invalidate("token")
+        store_b.publish("token", to_timestamp(expires_at), revoked_access=True)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert worker_a.get("token") is None
+    assert worker_b.get("token") is None
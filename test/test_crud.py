@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from login_db.enums import UserStatus
+from login_db.models import User
+from sqlalchemy.dialects import sqlite
+from api.crud import authenticate_user, create_jwt_token, insert_users
+from api.passwords import hash_password
+
+
+def create_mock_user(password):
+    return User(id=1,
+                username="test_user",
+                email="test@test.com",
+                password=hash_password(password),
+                status=UserStatus.ACTIVE)
+
+
+def test_authenticate_user_single_fetch(mocker):
+    session = mocker.AsyncMock()
+    session.scalar.return_value = create_mock_user("pw_test")
+
+    user = asyncio.run(authenticate_user("test_user", "pw_test", session=session))
+    assert user is not None
+    assert session.scalar.await_count == 1
+
+
+def test_authenticate_user_wrong_password(mocker):
+    session = mocker.AsyncMock()
+    session.scalar.return_value = create_mock_user("pw_test")
+
+    assert asyncio.run(authenticate_user("test_user", "wrong", session=session)) is None
+
+
+def test_authenticate_user_unknown(mocker):
+    session = mocker.AsyncMock()
+    session.scalar.return_value = None
+
+    assert asyncio.run(authenticate_user("nobody", "pw_test", session=session)) is None
+
+
+def test_insert_users_skips_existing_without_hashing(mocker):
+    session = mocker.AsyncMock()
+    session.execute.return_value = [("taken", "taken@test.com")]
+    session.scalars.return_value = ["new_user"]
+    hash_passwords = mocker.patch("api.crud.hash_passwords", return_value=["hashed"])
+
+    rows = [{"username": "taken", "email": "other@test.com", "password": "pw"},
+            {"username": "new_user", "email": "new@test.com", "password": "pw"},
+            {"username": "new_user", "email": "dup@test.com", "password": "pw"}]
+    errors = asyncio.run(insert_users(rows, session=session))
+    assert sorted(errors) == [0, 2]
+    hash_passwords.assert_awaited_once_with(["pw"])
+    assert session.commit.await_count == 1
+
+
+def test_insert_users_uses_the_session_dialect(mocker):
+    session = mocker.AsyncMock()
+    session.bind.dialect.name = "sqlite"
+    session.execute.return_value = []
+    session.scalars.return_value = ["new_user"]
+    mocker.patch("api.crud.hash_passwords", return_value=["hashed"])
+
+    rows = [{"username": "new_user", "email": "new@test.com", "password": "pw"}]
+    assert asyncio.run(insert_users(rows, session=session)) == {}
+    statement = session.scalars.call_args.args[0]
+    assert "ON CONFLICT DO NOTHING" in str(statement.compile(dialect=sqlite.dialect()))
+
+
+def test_create_jwt_token_unique_and_keeps_claims(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    expiration_time = datetime.utcnow() + timedelta(minutes=5)
+    data = {"sub": "1", "exp": expiration_time}
+
+    first = asyncio.run(create_jwt_token(data=data, session=session))
+    second = asyncio.run(create_jwt_token(data=data, session=session))
+    assert first != second
+    assert data["exp"] is expiration_time
+    assert session.add.call_args.args[0].expiration_time == expiration_time
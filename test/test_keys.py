@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+from jose import JWTError, jwt
+from api.exceptions import MissingEnvironmentVariableError
+from api.keygen import main as generate_key
+from api.keys import load_key_ring
+from api.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def claims():
+    return {"sub": "1", "exp": datetime.utcnow() + timedelta(minutes=5)}
+
+
+def test_es256_tokens_carry_kid_and_verify(tmp_path, capsys):
+    generate_key(["--dir", str(tmp_path), "--algorithm", "ES256", "--kid", "k1"])
+    key_ring = load_key_ring("ES256", str(tmp_path), None, None)
+
+    token = key_ring.encode(claims())
+    assert jwt.get_unverified_header(token)["kid"] == "k1"
+    assert key_ring.decode(token)["sub"] == "1"
+
+
+def test_rotation_keeps_old_tokens_valid(tmp_path, capsys):
+    generate_key(["--dir", str(tmp_path), "--algorithm", "ES256", "--kid", "old"])
+    old_token = load_key_ring("ES256", str(tmp_path), None, None).encode(claims())
+    generate_key(["--dir", str(tmp_path), "--algorithm", "ES256", "--kid", "new"])
+
+    with pytest.raises(MissingEnvironmentVariableError):
+        load_key_ring("ES256", str(tmp_path), None, None)
+    key_ring = load_key_ring("ES256", str(tmp_path), "new", None)
+    assert jwt.get_unverified_header(key_ring.encode(claims()))["kid"] == "new"
+    assert key_ring.decode(old_token)["sub"] == "1"
+
+    forged = jwt.encode(claims(), "secret", algorithm="HS256", headers={"kid": "unknown"})
+    with pytest.raises(JWTError):
+        key_ring.decode(forged)
+
+
+def test_jwks_publishes_public_keys_only(tmp_path, capsys):
+    generate_key(["--dir", str(tmp_path), "--algorithm", "ES256", "--kid", "k1"])
+    keys = load_key_ring("ES256", str(tmp_path), None, None).jwks()["keys"]
+    assert [(key["kid"], key["kty"], key["alg"]) for key in keys] == [("k1", "EC", "ES256")]
+    assert "d" not in keys[0]
+
+    assert load_key_ring("HS256", secret="secret").jwks() == {"keys": []}
+
+
+def test_jwks_endpoint():
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "keys" in response.json()
+    assert "max-age" in response.headers["Cache-Control"]
@@ -0,0 +1,38 @@
+import json
+import logging
+import os
+import queue
+
+from api.logger import DebugSampler, DroppingQueueHandler, JsonFormatter, log_file_path
+
+
+def create_record(level=logging.INFO, msg="Invalid login attempt for username: %s", args=("test",)):
+    return logging.LogRecord("api.main", level, __file__, 1, msg, args, None)
+
+def test_json_formatter_includes_extra_fields():
+    record = create_record()
+    record.ip = "127.0.0.1"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "api.main"
+    assert entry["message"] == "Invalid login attempt for username: test"
+    assert entry["ip"] == "127.0.0.1"
+
+def test_debug_sampler():
+    assert DebugSampler(0).filter(create_record(logging.INFO))
+    assert not DebugSampler(0).filter(create_record(logging.DEBUG))
+    assert DebugSampler(1).filter(create_record(logging.DEBUG))
+
+def test_queue_handler_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(create_record())
+    handler.handle(create_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().getMessage() == "Invalid login attempt for username: test"
+
+
+def test_log_file_per_process():
+    assert log_file_path("logs/application.log", per_process=False) == "logs/application.log"
+    assert log_file_path("logs/application.log", per_process=True) == f"logs/application-{os.getpid()}.log"
@@ -1,6 +1,8 @@
 from login_db.enums import UserStatus
 from login_db.models import User
+from api.exceptions import OverloadedError
 from api.main import app
+from api.ratelimit import LOGIN_MAX_FAILURES
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
@@ -14,24 +16,22 @@ def create_mock_user(status):
 
 
 def test_login_ok(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=True)
-    
     mock_user = create_mock_user(UserStatus.ACTIVE)
-    mocker.patch('api.main.retrieve_user', return_value=mock_user)
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
     
     mocker.patch('api.main.create_jwt_token', return_value="mock_token")
+    mocker.patch('api.main.issue_refresh_token', return_value="mock_refresh_token")
 
     data = {"username": "test", "password": "pw_test"}
     response = client.post("/login/", json=data)
     assert response.status_code == 200
     assert response.json()["token"] is not None
+    assert response.json()["refresh_token"] == "mock_refresh_token"
 
 
 def test_login_pending_user(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=True)
-    
     mock_user = create_mock_user(UserStatus.PENDING)
-    mocker.patch('api.main.retrieve_user', return_value=mock_user)
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
     
     data = {"username": "test", "password": "pw_test"}
     response = client.post("/login/", json=data)
@@ -40,10 +40,8 @@ def test_login_pending_user(mocker):
 
 
 def test_login_banned_user(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=True)
-    
     mock_user = create_mock_user(UserStatus.BANNED)
-    mocker.patch('api.main.retrieve_user', return_value=mock_user)
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
 
     data = {"username": "test", "password": "pw_test"}
     response = client.post("/login/", json=data)
@@ -52,10 +50,8 @@ def test_login_banned_user(mocker):
 
 
 def test_login_deleted_user(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=True)
-    
     mock_user = create_mock_user(UserStatus.DELETED)
-    mocker.patch('api.main.retrieve_user', return_value=mock_user)
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
 
     data = {"username": "test", "password": "pw_test"}
     response = client.post("/login/", json=data)
@@ -64,10 +60,8 @@ def test_login_deleted_user(mocker):
 
 
 def test_login_inactive_user(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=True)
-    
     mock_user = create_mock_user(UserStatus.INACTIVE)
-    mocker.patch('api.main.retrieve_user', return_value=mock_user)
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
 
 
     data = {"username": "test", "password": "pw_test"}
@@ -77,9 +71,72 @@ def test_login_inactive_user(mocker):
 
 
 def test_login_invalid_credentials(mocker):
-    mocker.patch("api.main.is_username_password_valid", return_value=False)
+    mocker.patch("api.main.authenticate_user", return_value=None)
 
     data = {"username": "test", "password": "pw_test"}
     response = client.post("/login/", json=data)
     assert response.status_code == 400
     assert response.json()["detail"] == "Incorrect username and password combination"
+
+
+def test_login_overloaded(mocker):
+    mocker.patch("api.main.authenticate_user", side_effect=OverloadedError("hash pool is full."))
+
+    data = {"username": "test", "password": "pw_test"}
+    response = client.post("/login/", json=data)
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Server overloaded, try again later."
+
+
+def test_login_locked_out_before_hashing(mocker):
+    authenticate_user = mocker.patch("api.main.authenticate_user", return_value=None)
+
+    data = {"username": "locked_user", "password": "wrong"}
+    for _ in range(LOGIN_MAX_FAILURES):
+        assert client.post("/login/", json=data).status_code == 400
+
+    response = client.post("/login/", json=data)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert authenticate_user.call_count == LOGIN_MAX_FAILURES
+
+
+def test_lockout_shared_by_username_and_email(mocker):
+    account = create_mock_user(UserStatus.ACTIVE)
+    account.id = 1
+
+    async def wrong_password(username, password, session, check=None):
+        check(account)
+        return None
+    authenticate_user = mocker.patch("api.main.authenticate_user", side_effect=wrong_password)
+
+    for attempt in range(LOGIN_MAX_FAILURES):
+        username = "test_user" if attempt % 2 else "test@test.com"
+        assert client.post("/login/", json={"username": username, "password": "wrong"}).status_code == 400
+
+    response = client.post("/login/", json={"username": "test_user", "password": "wrong"})
+    assert response.status_code == 429
+    assert authenticate_user.call_count == LOGIN_MAX_FAILURES + 1
+
+
+def test_login_refused_status_keeps_failure_count(mocker):
+    record_success = mocker.patch("api.main.login_throttle.record_success")
+    mocker.patch("api.main.authenticate_user", return_value=create_mock_user(UserStatus.BANNED))
+
+    data = {"username": "test", "password": "pw_test"}
+    assert client.post("/login/", json=data).status_code == 400
+    record_success.assert_not_called()
+
+
+def test_login_rehashes_stale_password_in_background(mocker, mock_session):
+    mock_user = create_mock_user(UserStatus.ACTIVE)
+    mock_user.id = 1
+    mocker.patch("api.main.authenticate_user", return_value=mock_user)
+    mocker.patch("api.main.create_jwt_token", return_value="mock_token")
+    mocker.patch("api.main.needs_rehash", return_value=True)
+    rehash_password = mocker.patch("api.main.rehash_password", return_value=True)
+
+    data = {"username": "test", "password": "pw_test"}
+    response = client.post("/login/", json=data)
+    assert response.status_code == 200
+    assert rehash_password.call_args.args == (1, "pw_test", "pw_test")
@@ -1,4 +1,5 @@
 from login_db.models import Token, TokenStatus
+from api.cache import token_cache
 from api.main import app
 from fastapi.testclient import TestClient
 
@@ -13,26 +14,57 @@ def create_mock_token(status):
     return Token(token="mock_token",
                  status=status)
 
-def test_logout_valid_token(mocker):
-    mock_session = mocker.MagicMock()
-    mocker.patch('api.main.Session', autospec=True, return_value=mock_session)
-
+def test_logout_valid_token(mocker, mock_session):
     mock_token = create_mock_token(TokenStatus.ACTIVE)
-    mock_session.__enter__.return_value.query.return_value.filter.return_value.first.return_value = mock_token
+    mock_session.scalar.return_value = mock_token
 
     data = {"token": "mock_token"}
     response = client.post("/logout/", json=data)
     assert response.status_code == 200
     assert response.json()["message"] == "Logged out successfully."
 
-def test_logout_invalid_token(mocker):
-    mock_session = mocker.MagicMock()
-    mocker.patch('api.main.Session', autospec=True, return_value=mock_session)
-
+def test_logout_invalid_token(mocker, mock_session):
     mock_token = None
-    mock_session.__enter__.return_value.query.return_value.filter.return_value.first.return_value = mock_token
+    mock_session.scalar.return_value = mock_token
 
     data = {"token": "mock_token"}
     response = client.post("/logout/", json=data)
     assert response.status_code == 400
     assert response.json()["detail"] == "Invalid token."
+
+def test_logout_invalidates_cached_token(mocker, mock_session):
+    token_cache.set("mock_token", TokenStatus.ACTIVE.name)
+    mock_session.scalar.return_value = create_mock_token(TokenStatus.ACTIVE)
+
+    data = {"token": "mock_token"}
+    response = client.post("/logout/", json=data)
+    assert response.status_code == 200
+    assert token_cache.get("mock_token") is None
+
+def test_logout_all_revokes_every_user_token(mocker, mock_session):
+    token = create_mock_token(TokenStatus.ACTIVE)
+    token.user_id = 1
+    mock_session.scalar.return_value = token
+    revoke_user_tokens = mocker.patch("api.main.revoke_user_tokens",
+                                      return_value=[("mock_token", None, None), ("other_token", None, None)])
+    token_cache.set("other_token", TokenStatus.ACTIVE.name)
+
+    response = client.post("/logout-all/", json={"token": "mock_token"})
+    assert response.status_code == 200
+    assert response.json()["revoked"] == 2
+    assert revoke_user_tokens.call_args.args[0] == [1]
+    assert token_cache.get("other_token") is None
+
+def test_logout_all_invalid_token(mocker, mock_session):
+    mock_session.scalar.return_value = None
+
+    response = client.post("/logout-all/", json={"token": "mock_token"})
+    assert response.status_code == 400
+
+def test_logout_publishes_to_shared_store(mocker, mock_session):
+    shared_store = mocker.patch("api.main.shared_store")
+    mock_session.scalar.return_value = create_mock_token(TokenStatus.ACTIVE)
+
+    response = client.post("/logout/", json={"token": "mock_token"})
+    assert response.status_code == 200
+    assert shared_store.publish.call_args.args[0] == "mock_token"
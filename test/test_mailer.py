@@ -0,0 +1,99 @@
+import asyncio
+import smtplib
+
+import pytest
+
+from api.mailer import FakeSMTPSink, MailDeliveryError, MailQueue, SMTPTransport, build_message
+
+
+def create_queue(transport, **kwargs):
+    options = {"workers": 1, "queue_size": 10, "batch_size": 5, "max_retries": 2, "backoff": 0}
+    options.update(kwargs)
+    return MailQueue(transport, **options)
+
+def test_mail_queue_delivers_in_batches():
+    sink = FakeSMTPSink()
+    queue = create_queue(sink)
+
+    async def scenario():
+        for i in range(7):
+            queue.submit(build_message(f"user{i}@test.com", "subject", "body"))
+        queue.start()
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert len(sink.outbox) == 7
+    assert sink.batches == 2
+    assert queue.sent == 7
+
+def test_mail_queue_retries_failures():
+    class FlakyTransport(FakeSMTPSink):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        def send(self, messages):
+            self.calls += 1
+            if self.calls == 1:
+                raise ConnectionError("smtp down")
+            super().send(messages)
+
+    transport = FlakyTransport()
+    queue = create_queue(transport)
+
+    async def scenario():
+        queue.submit(build_message("user@test.com", "subject", "body"))
+        queue.start()
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert transport.calls == 2
+    assert len(transport.outbox) == 1
+
+def test_mail_queue_retries_only_undelivered_messages():
+    class PartialTransport(FakeSMTPSink):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        def send(self, messages):
+            self.calls += 1
+            if self.calls == 1:
+                # First message delivered, then the connection dropped
+                self.outbox.append(messages[0])
+                raise MailDeliveryError(messages[1:], ConnectionError("smtp down"))
+            super().send(messages)
+
+    transport = PartialTransport()
+    queue = create_queue(transport)
+
+    async def scenario():
+        for i in range(3):
+            queue.submit(build_message(f"user{i}@test.com", "subject", "body"))
+        queue.start()
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert sorted(message["To"] for message in transport.outbox) == ["user0@test.com", "user1@test.com",
+                                                                      "user2@test.com"]
+    assert queue.sent == 3
+
+def test_smtp_transport_reports_only_undelivered(mocker):
+    smtp = mocker.patch("api.mailer.smtplib.SMTP").return_value.__enter__.return_value
+    smtp.send_message.side_effect = [None, smtplib.SMTPRecipientsRefused({}), None]
+    messages = [build_message(f"user{i}@test.com", "subject", "body") for i in range(3)]
+
+    with pytest.raises(MailDeliveryError) as exc_info:
+        SMTPTransport("localhost", 25, starttls=False).send(messages)
+    assert exc_info.value.failed == [messages[1]]
+    assert smtp.send_message.call_count == 3
+
+def test_mail_queue_drops_when_full():
+    queue = create_queue(FakeSMTPSink(), queue_size=1)
+
+    async def scenario():
+        assert queue.submit(build_message("a@test.com", "subject", "body"))
+        assert not queue.submit(build_message("b@test.com", "subject", "body"))
+
+    asyncio.run(scenario())
+    assert queue.dropped == 1
@@ -0,0 +1,42 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.metrics import Counter, Histogram, MetricsMiddleware, REQUEST_COUNT, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/login/")
+    histogram.observe(0.5, "/login/")
+    histogram.observe(5, "/login/")
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/login/",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/login/",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/login/",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/login/"} 3' in lines
+    assert histogram.count("/login/") == 3
+
+
+def test_registry_renders_counters():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests.", ("status",)))
+    counter.inc("200")
+    counter.inc("200")
+    assert 'requests_total{status="200"} 2' in registry.render()
+
+
+def test_middleware_counts_known_and_unknown_routes():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    client = TestClient(app)
+    before = REQUEST_COUNT.value("GET", "/ping", "200")
+    client.get("/ping")
+    client.get("/does-not-exist")
+    assert REQUEST_COUNT.value("GET", "/ping", "200") == before + 1
+    assert REQUEST_COUNT.value("GET", "other", "404") >= 1
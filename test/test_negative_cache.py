@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from login_db.enums import TokenStatus, TokenType
+from login_db.models import Token
+from api.cache import missing_email_key, missing_token_key, negative_cache
+from api.crud import insert_token, insert_user
+from api.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def test_unknown_token_queried_once(mocker, mock_session):
+    mock_session.scalar.return_value = None
+
+    for _ in range(3):
+        response = client.post("/validate-token/", json={"token": "garbage"})
+        assert response.status_code == 400
+    for _ in range(3):
+        response = client.post("/logout/", json={"token": "garbage"})
+        assert response.status_code == 400
+    assert mock_session.scalar.await_count == 1
+    assert client.get("/cache-stats/").json()["negative"]["hits"] == 5
+
+
+def test_unknown_reset_token_does_not_hide_access_token(mocker, mock_session):
+    mock_session.scalar.return_value = None
+    response = client.post("/reset-password/", json={"token": "access_token", "password": "pw"})
+    assert response.status_code == 400
+
+    mock_session.scalar.return_value = Token(token="access_token", status=TokenStatus.ACTIVE)
+    response = client.post("/validate-token/", json={"token": "access_token"})
+    assert response.status_code == 200
+
+
+def test_unknown_email_queried_once(mocker, mock_session):
+    send_reset_email = mocker.patch("api.main.send_reset_email")
+    mock_session.scalar.return_value = None
+
+    for _ in range(3):
+        response = client.post("/forgotten-password/", json={"email": "nobody@test.com"})
+        assert response.status_code == 200
+    assert mock_session.scalar.await_count == 1
+    send_reset_email.assert_not_called()
+
+
+def test_inserts_invalidate_negative_entries(mocker):
+    mocker.patch("api.crud.hash_executor.run", return_value="hashed")
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    negative_cache.set(missing_email_key("new@test.com"), "missing")
+    negative_cache.set(missing_token_key("new_token"), "missing")
+
+    asyncio.run(insert_user({"username": "new", "email": "new@test.com", "password": "pw"}, session))
+    asyncio.run(insert_token(1, "new_token", TokenType.ACCESS, TokenStatus.ACTIVE, None, session))
+    assert negative_cache.get(missing_email_key("new@test.com")) is None
+    assert negative_cache.get(missing_token_key("new_token")) is None
+
+def test_missing_token_kept_one_flush_interval_with_write_behind(mocker, mock_session):
+    mocker.patch("api.cache.MISSING_TOKEN_TTL", 0.05)
+    mock_session.scalar.return_value = None
+
+    assert client.post("/validate-token/", json={"token": "buffered"}).status_code == 400
+    _, deadline = negative_cache._entries[missing_token_key("buffered")]
+    assert deadline <= time.time() + 0.05
@@ -0,0 +1,43 @@
+import pytest
+
+from api import passwords
+from api.passwords import calibrate, configure_cost, hash_password, needs_rehash, set_cost, verify_password
+
+
+@pytest.fixture(autouse=True)
+def isolated_context(mocker):
+    mocker.patch("api.passwords.pwd_context", passwords.pwd_context.copy())
+
+
+def test_lower_cost_hashes_need_rehash():
+    set_cost(10)
+    hashed = hash_password("pw_test")
+    assert hashed.startswith("$2b$10$")
+    assert not needs_rehash(hashed)
+
+    set_cost(11)
+    assert needs_rehash(hashed)
+    assert verify_password("pw_test", hashed)
+    assert hash_password("pw_test").startswith("$2b$11$")
+
+def test_stronger_hashes_are_kept():
+    set_cost(11)
+    hashed = hash_password("pw_test")
+    set_cost(10)
+    assert not needs_rehash(hashed)
+
+def test_unknown_hash_does_not_need_rehash():
+    assert not needs_rehash("pw_test")
+
+def test_calibrate_extrapolates_bcrypt_cost(mocker):
+    # 10ms at cost 10, doubling per round
+    mocker.patch("api.passwords.measure_verify", side_effect=lambda cost: 0.01 * 2 ** (cost - 10))
+    assert calibrate(target_ms=90) == 13
+    assert calibrate(target_ms=1) == 10
+    assert calibrate(target_ms=10 ** 6) == 16
+
+def test_configure_cost_prefers_explicit_setting(mocker):
+    mocker.patch("api.passwords.PASSWORD_HASH_COST", "10")
+    measure_verify = mocker.patch("api.passwords.measure_verify")
+    assert configure_cost() == 10
+    assert measure_verify.call_count == 0
@@ -0,0 +1,43 @@
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from api.database import get_pool_options
+from api.main import app
+from api.metrics import DB_POOL_TIMEOUTS
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def test_pool_options_for_postgres(mocker):
+    mocker.patch("api.database.DB_PREPARE_THRESHOLD", "none")
+    options = get_pool_options("postgresql+psycopg://user:pw@db/login")
+    assert options["pool_timeout"] == 2
+    assert options["pool_recycle"] == 1800
+    assert options["connect_args"] == {"prepare_threshold": None}
+
+
+def test_pool_options_for_sqlite():
+    assert set(get_pool_options("sqlite+aiosqlite:///bench.db")) == {"query_cache_size"}
+
+
+def test_pool_timeout_returns_503(mocker):
+    mocker.patch("api.main.authenticate_user", side_effect=PoolTimeoutError("QueuePool limit reached"))
+    timeouts = DB_POOL_TIMEOUTS.value()
+
+    response = client.post("/login/", json={"username": "test", "password": "pw_test"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert DB_POOL_TIMEOUTS.value() == timeouts + 1
+
+
+def test_pool_timeout_on_register_is_not_a_500(mocker, mock_session):
+    mocker.patch("api.main.insert_user", side_effect=PoolTimeoutError("QueuePool limit reached"))
+
+    response = client.post("/register/", json={"username": "test", "email": "test@test.com", "password": "pw"})
+    assert response.status_code == 503
+
+
+def test_pool_gauges_exported():
+    body = client.get("/metrics").text
+    assert "db_pool_checked_out 0" in body
+    assert "db_pool_timeouts_total" in body
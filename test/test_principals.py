@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from login_db.enums import TokenStatus, UserStatus
+from login_db.models import User
+from api.cache import token_cache
+from api.keys import key_ring
+from api.main import app
+from api.principals import user_cache, user_key
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def create_access_token(user_id=7):
+    return key_ring.encode({"sub": str(user_id), "exp": datetime.utcnow() + timedelta(minutes=5)})
+
+
+def create_mock_user(status=UserStatus.ACTIVE):
+    return User(id=7, username="test_user", email="test@test.com", password="pw_test", status=status)
+
+
+def test_me_loads_user_once(mocker, mock_session):
+    token = create_access_token()
+    token_cache.set(token, TokenStatus.ACTIVE.name)
+    mock_session.get.return_value = create_mock_user()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(3):
+        response = client.get("/me/", headers=headers)
+        assert response.status_code == 200
+    assert response.json() == {"id": 7, "username": "test_user", "email": "test@test.com"}
+    assert mock_session.get.await_count == 1
+
+
+def test_me_rejects_inactive_user(mocker, mock_session):
+    token = create_access_token()
+    token_cache.set(token, TokenStatus.ACTIVE.name)
+    mock_session.get.return_value = create_mock_user(UserStatus.BANNED)
+
+    response = client.get("/me/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+
+def test_me_rejects_logged_out_token(mocker, mock_session):
+    token = create_access_token()
+    token_cache.set(token, TokenStatus.LOGGED_OUT.name)
+
+    response = client.get("/me/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+    mock_session.get.assert_not_called()
+
+
+def test_admin_user_status_invalidates_cached_user(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    user_cache.set(user_key(7), "cached")
+    mock_session.scalars.return_value = [7]
+    revoke_user_tokens = mocker.patch("api.main.revoke_user_tokens", return_value=[])
+    mocker.patch("api.main.revoke_user_refresh_tokens", return_value=0)
+
+    response = client.post("/admin/user-status/", json={"users": ["test_user"], "status": "BANNED"},
+                           headers={"X-Admin-Key": "admin_key"})
+    assert response.status_code == 200
+    assert response.json() == {"updated": 1, "revoked": 0}
+    assert revoke_user_tokens.call_args.args[0] == [7]
+    assert user_cache.get(user_key(7)) is None
+
+
+def test_admin_user_status_unknown_status(mocker, mock_session):
+    mocker.patch("api.main.ADMIN_API_KEY", "admin_key")
+    response = client.post("/admin/user-status/", json={"users": ["test_user"], "status": "NOPE"},
+                           headers={"X-Admin-Key": "admin_key"})
+    assert response.status_code == 400
+
+
+def test_reset_password_invalidates_cached_user(mocker, mock_session):
+    user_cache.set(user_key(7), "cached")
+    reset_token = mocker.MagicMock(user_id=7, status=TokenStatus.ACTIVE, expiration_time=datetime.utcnow())
+    mock_session.scalar.return_value = reset_token
+    mocker.patch("api.main.modify_user_password")
+    mocker.patch("api.main.revoke_user_refresh_tokens")
+
+    response = client.post("/reset-password/", json={"token": "reset", "password": "new"})
+    assert response.status_code == 200
+    assert user_cache.get(user_key(7)) is None
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from login_db.models import Token
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from api.database import get_session
+from api.main import app
+from api.metrics import instrument_engine
+from api.models import ensure_tables
+from api.querystats import query_budget
+
+client = TestClient(app)
+
+
+async def create_tables(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Token.metadata.create_all)
+    await ensure_tables(engine)
+
+
+@pytest.fixture
+def sqlite_session(mocker, tmp_path):
+    """Point the app at a real SQLite database, counted like the production engine."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'budget.db'}", poolclass=NullPool)
+    instrument_engine(engine)
+    asyncio.run(create_tables(engine))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_session():
+        async with session_factory() as session:
+            yield session
+    app.dependency_overrides[get_session] = override_session
+    mocker.patch("api.main.AsyncSessionLocal", session_factory)
+    yield
+    app.dependency_overrides.pop(get_session, None)
+    asyncio.run(engine.dispose())
+
+
+def test_endpoints_stay_within_query_budgets(sqlite_session):
+    with query_budget() as requests:
+        response = client.post("/register/", json={"username": "budget", "email": "budget@test.com",
+                                                    "password": "pw_test"})
+        assert response.status_code == 200
+        response = client.post("/login/", json={"username": "budget", "password": "pw_test"})
+        assert response.status_code == 200
+        token, refresh_token = response.json()["token"], response.json()["refresh_token"]
+        assert client.post("/validate-token/", json={"token": token}).status_code == 200
+        response = client.post("/refresh/", json={"refresh_token": refresh_token})
+        assert response.status_code == 200
+        assert client.post("/logout/", json={"token": response.json()["token"]}).status_code == 200
+
+    assert [stats.route for stats in requests] == ["/register/", "/login/", "/validate-token/", "/refresh/", "/logout/"]
+    assert all(stats.statements > 0 for stats in requests)
+    requests.check()
@@ -0,0 +1,66 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from api.metrics import MetricsMiddleware, instrument_engine
+from api.querystats import QUERY_BUDGETS, QueryStats, query_budget
+
+engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+instrument_engine(engine)
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/queries/{count}")
+async def run_queries(count: int):
+    with engine.connect() as conn:
+        for _ in range(count):
+            conn.execute(text("SELECT 1"))
+    return {"count": count}
+
+
+client = TestClient(app)
+
+
+def test_statements_counted_in_headers(mocker):
+    mocker.patch("api.metrics.QUERY_STATS_HEADERS", True)
+    response = client.get("/queries/3")
+    assert response.headers["x-db-statements"] == "3"
+    assert float(response.headers["x-db-time-ms"]) >= 0
+
+
+def test_headers_off_by_default():
+    assert "x-db-statements" not in client.get("/queries/1").headers
+
+
+def test_query_budget_fails_over_budget():
+    with query_budget(max_statements=2) as requests:
+        client.get("/queries/2")
+    requests.check()
+
+    with query_budget(max_statements=2) as requests:
+        client.get("/queries/3")
+    with pytest.raises(AssertionError, match="3 statements"):
+        requests.check()
+
+
+def test_query_budget_uses_declared_budgets(mocker):
+    mocker.patch.dict(QUERY_BUDGETS, {"other": 1})
+    with query_budget() as requests:
+        client.get("/queries/2")
+    assert len(requests) == 1
+    with pytest.raises(AssertionError):
+        requests.check()
+
+
+def test_repeated_statements_reported():
+    stats = QueryStats()
+    for _ in range(5):
+        stats.add("SELECT * FROM tokens WHERE user_id = ?", 1, 0.001)
+    stats.add("SELECT * FROM users", 10, 0.001)
+    assert stats.repeated(threshold=5) == [("SELECT * FROM tokens WHERE user_id = ?", 5)]
+    assert stats.statements == 6
+    assert stats.rows == 15
@@ -0,0 +1,61 @@
+import pytest
+
+from api.exceptions import RateLimitedError
+from api.ratelimit import LoginThrottle, MemoryStore, SlidingWindowLimiter
+
+
+def create_throttle(store, max_failures=3):
+    return LoginThrottle(store, max_failures=max_failures, failure_window=60,
+                         lockout=10, backoff=2, max_lockout=30)
+
+def test_sliding_window_limiter_rejects_over_limit():
+    limiter = SlidingWindowLimiter(MemoryStore(max_keys=100), limit=3, window=60)
+    for _ in range(3):
+        limiter.hit("login:ip:1.2.3.4")
+    with pytest.raises(RateLimitedError) as exc_info:
+        limiter.hit("login:ip:1.2.3.4")
+    assert 0 < exc_info.value.retry_after <= 60
+    limiter.hit("login:ip:5.6.7.8")
+
+def test_memory_store_is_bounded():
+    store = MemoryStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.incr(key, ttl=60)
+    assert len(store) == 2
+    assert store.get("a") == 0
+
+def test_lockout_after_failures_with_backoff():
+    store = MemoryStore(max_keys=100)
+    throttle = create_throttle(store)
+    for _ in range(3):
+        throttle.check_lockout("Test")
+        throttle.record_failure("Test")
+    with pytest.raises(RateLimitedError) as exc_info:
+        throttle.check_lockout("test")
+    assert exc_info.value.retry_after <= 10
+
+    # Second lockout in a row lasts twice as long
+    store.delete("lock:name:test")
+    for _ in range(3):
+        throttle.record_failure("test")
+    with pytest.raises(RateLimitedError) as exc_info:
+        throttle.check_lockout("test")
+    assert 10 < exc_info.value.retry_after <= 20
+
+def test_success_resets_failures():
+    throttle = create_throttle(MemoryStore(max_keys=100))
+    throttle.record_failure("test")
+    throttle.record_failure("test")
+    throttle.record_success("test")
+    throttle.record_failure("test")
+    throttle.check_lockout("test")
+
+def test_username_and_email_share_the_account_budget():
+    throttle = create_throttle(MemoryStore(max_keys=100))
+    throttle.record_failure("test", user_id=1)
+    throttle.record_failure("test@test.com", user_id=1)
+    throttle.record_failure("test", user_id=1)
+    # Neither name reached 3 failures, the account did
+    throttle.check_lockout("test@test.com")
+    with pytest.raises(RateLimitedError):
+        throttle.check_lockout("test@test.com", user_id=1)
@@ -0,0 +1,48 @@
+import asyncio
+
+from api.models import RefreshToken
+from api.reaper import index_ddl, reap_expired_tokens
+
+
+def create_session_factory(mocker, rowcounts):
+    session = mocker.AsyncMock()
+    session.execute.side_effect = [mocker.MagicMock(rowcount=count) for count in rowcounts]
+    session_factory = mocker.MagicMock()
+    session_factory.return_value.__aenter__.return_value = session
+    return session_factory, session
+
+def test_reaper_deletes_in_chunks(mocker):
+    session_factory, session = create_session_factory(mocker, [10, 10, 3])
+
+    total = asyncio.run(reap_expired_tokens(session_factory, chunk_size=10))
+    assert total == 23
+    assert session.commit.await_count == 3
+
+def test_reaper_stops_when_nothing_left(mocker):
+    session_factory, session = create_session_factory(mocker, [0])
+
+    assert asyncio.run(reap_expired_tokens(session_factory, chunk_size=10)) == 0
+    assert session.commit.await_count == 1
+
+def test_reaper_cleans_refresh_tokens(mocker):
+    session_factory, session = create_session_factory(mocker, [4])
+
+    assert asyncio.run(reap_expired_tokens(session_factory, chunk_size=10, model=RefreshToken)) == 4
+    statement = str(session.execute.call_args.args[0])
+    assert statement.startswith("DELETE FROM refresh_tokens")
+    assert "refresh_tokens.expiration_time" in statement
+
+def test_reaper_archives_refresh_tokens(mocker):
+    mocker.patch("api.reaper.REAPER_REFRESH_ARCHIVE_TABLE", "refresh_token_archive")
+    session_factory, session = create_session_factory(mocker, [1])
+
+    asyncio.run(reap_expired_tokens(session_factory, chunk_size=10, model=RefreshToken))
+    statement = str(session.execute.call_args.args[0])
+    assert statement.startswith("WITH moved AS")
+    assert "INSERT INTO refresh_token_archive" in statement
+
+def test_index_ddl_is_concurrent():
+    for statement in index_ddl():
+        assert statement.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+    assert any("ix_refresh_tokens_expiration_time" in statement for statement in index_ddl())
+    assert not any("ix_token_token " in statement for statement in index_ddl())
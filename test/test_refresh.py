@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from login_db.enums import UserStatus
+from login_db.models import User
+from api.main import app
+from api.models import RefreshToken, RefreshTokenStatus
+from api.refresh import hash_refresh_token, issue_refresh_token, rotate_refresh_token
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def create_stored_token(status, expires_in=timedelta(days=1)):
+    return RefreshToken(id=1,
+                        token_hash=hash_refresh_token("refresh"),
+                        family_id="family",
+                        user_id=7,
+                        status=status,
+                        expiration_time=datetime.utcnow() + expires_in)
+
+
+def test_refresh_issues_new_tokens(mocker, mock_session):
+    mocker.patch("api.main.rotate_refresh_token", return_value=(7, "new_refresh"))
+    create_jwt_token = mocker.patch("api.main.create_jwt_token", return_value="new_access")
+
+    response = client.post("/refresh/", json={"refresh_token": "refresh"})
+    assert response.status_code == 200
+    assert response.json() == {"token": "new_access", "refresh_token": "new_refresh"}
+    assert create_jwt_token.call_args.kwargs["data"]["sub"] == "7"
+
+
+def test_refresh_invalid_token(mocker, mock_session):
+    mocker.patch("api.main.rotate_refresh_token", return_value=None)
+    create_jwt_token = mocker.patch("api.main.create_jwt_token")
+
+    response = client.post("/refresh/", json={"refresh_token": "refresh"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid or expired refresh token"
+    create_jwt_token.assert_not_called()
+
+
+def test_issue_refresh_token_stores_only_the_hash(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+
+    token = asyncio.run(issue_refresh_token(7, session))
+    stored = session.add.call_args.args[0]
+    assert stored.token_hash == hash_refresh_token(token)
+    assert stored.token_hash != token
+    assert stored.status == RefreshTokenStatus.ACTIVE
+
+
+def test_issue_refresh_token_uses_write_behind(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    writer = mocker.patch("api.refresh.token_writer")
+    writer.running = True
+
+    token = asyncio.run(issue_refresh_token(7, session))
+    row = writer.insert.call_args.args[0]
+    assert writer.insert.call_args.kwargs == {"model": RefreshToken, "key": hash_refresh_token(token)}
+    assert row["user_id"] == 7
+    session.add.assert_not_called()
+    session.commit.assert_not_called()
+
+
+def test_rotate_marks_used_and_keeps_family(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    session.scalar.return_value = create_stored_token(RefreshTokenStatus.ACTIVE)
+    session.get.return_value = User(id=7, status=UserStatus.ACTIVE)
+    session.execute.return_value.rowcount = 1
+
+    user_id, new_token = asyncio.run(rotate_refresh_token("refresh", session))
+    assert user_id == 7
+    assert new_token != "refresh"
+    assert session.add.call_args.args[0].family_id == "family"
+
+
+def test_rotate_reused_token_revokes_family(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    session.scalar.return_value = create_stored_token(RefreshTokenStatus.USED)
+
+    assert asyncio.run(rotate_refresh_token("refresh", session)) is None
+    revoke = session.execute.call_args.args[0]
+    assert "refresh_tokens.family_id" in str(revoke)
+    session.add.assert_not_called()
+
+
+def test_rotate_concurrent_loser_revokes_family(mocker):
+    session = mocker.AsyncMock()
+    session.add = mocker.MagicMock()
+    session.scalar.return_value = create_stored_token(RefreshTokenStatus.ACTIVE)
+    session.get.return_value = User(id=7, status=UserStatus.ACTIVE)
+    session.execute.return_value.rowcount = 0
+
+    assert asyncio.run(rotate_refresh_token("refresh", session)) is None
+    assert session.execute.call_count == 2
+    session.add.assert_not_called()
+
+
+def test_rotate_rejects_expired_and_inactive(mocker):
+    session = mocker.AsyncMock()
+    session.scalar.return_value = create_stored_token(RefreshTokenStatus.ACTIVE, expires_in=timedelta(seconds=-1))
+    assert asyncio.run(rotate_refresh_token("refresh", session)) is None
+
+    session.scalar.return_value = create_stored_token(RefreshTokenStatus.ACTIVE)
+    session.get.return_value = User(id=7, status=UserStatus.BANNED)
+    assert asyncio.run(rotate_refresh_token("refresh", session)) is None
@@ -0,0 +1,26 @@
+import time
+
+from api.revocation import RevocationList, is_jwt
+
+
+def test_revocation_list_add_and_check():
+    revoked = RevocationList()
+    revoked.add("a.b.c", time.time() + 60)
+    assert revoked.is_revoked("a.b.c")
+    assert not revoked.is_revoked("d.e.f")
+
+
+def test_revocation_list_replace_keeps_recent_local_adds():
+    revoked = RevocationList()
+    started_at = time.time()
+    revoked.add("local.token.x", time.time() + 60)
+    revoked.replace({"db.token.x": time.time() + 60, "old.token.x": time.time() - 1}, started_at)
+    assert revoked.is_revoked("local.token.x")
+    assert revoked.is_revoked("db.token.x")
+    assert not revoked.is_revoked("old.token.x")
+    assert len(revoked) == 2
+
+
+def test_is_jwt():
+    assert is_jwt("header.payload.signature")
+    assert not is_jwt("opaque_reset_token")
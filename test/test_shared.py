@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from api.exceptions import RateLimitedError
+from api.ratelimit import FallbackStore, MemoryStore, SlidingWindowLimiter
+from api.shared import SQLiteSharedStore, run_shared_sync
+
+
+def test_counters_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first, second = SQLiteSharedStore(path), SQLiteSharedStore(path)
+
+    assert first.incr("key", ttl=60) == 1
+    assert second.incr("key", ttl=60) == 2
+    assert first.get("key") == 2
+    second.delete("key")
+    assert first.get("key") == 0
+
+def test_expired_counter_restarts(tmp_path):
+    store = SQLiteSharedStore(str(tmp_path / "shared.db"))
+    store.incr("key", ttl=0.01)
+    time.sleep(0.02)
+    assert store.get("key") == 0
+    assert store.incr("key", ttl=60) == 1
+
+def test_limiter_on_shared_store(tmp_path):
+    path = str(tmp_path / "shared.db")
+    # Two workers, each with its own limiter, share one budget
+    limiters = [SlidingWindowLimiter(SQLiteSharedStore(path), limit=3, window=60) for _ in range(2)]
+    limiters[0].hit("ip")
+    limiters[1].hit("ip")
+    limiters[0].hit("ip")
+    with pytest.raises(RateLimitedError):
+        limiters[1].hit("ip")
+
+def test_sync_replays_invalidations_from_other_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    publisher, subscriber = SQLiteSharedStore(path), SQLiteSharedStore(path)
+    publisher.publish("old_token", time.time() + 60, revoked_access=True)
+    applied = []
+
+    async def run():
+        task = asyncio.create_task(run_shared_sync(subscriber, lambda *event: applied.append(event), interval=0.01))
+        await asyncio.sleep(0.03)
+        publisher.publish("new_token", 123.0, revoked_access=False)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    # Only entries published after the worker started are replayed
+    assert applied == [("new_token", False, 123.0)]
+
+def test_locked_file_falls_back_to_memory_counters(tmp_path):
+    path = str(tmp_path / "shared.db")
+    shared = SQLiteSharedStore(path, busy_timeout_ms=5)
+    store = FallbackStore(shared, MemoryStore(max_keys=100))
+    limiter = SlidingWindowLimiter(store, limit=2, window=60)
+    limiter.hit("ip")
+    # Another worker holding the write lock
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    started = time.monotonic()
+    limiter.hit("ip")
+    limiter.hit("ip")
+    # Still limited, counted in this process while the file is locked
+    with pytest.raises(RateLimitedError):
+        limiter.hit("ip")
+    assert time.monotonic() - started < 0.5
+    assert store.fallbacks > 0 and shared.failures == store.fallbacks
+    assert shared.cache_get("key") is None
+    blocker.execute("ROLLBACK")
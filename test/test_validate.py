@@ -1,7 +1,12 @@
+import time
 from login_db.models import Token, TokenType, TokenStatus
+from api import revocation
+from api.config import ALGORITHM, SECRET_KEY
 from api.main import app
+from api.revocation import RevocationList
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
+from jose import jwt
 
 
 client = TestClient(app)
@@ -13,14 +18,11 @@ def create_mock_token(status, expiration_time):
                  user_id=1,
                  type=TokenType.RESET_PASSWORD)
 
-def test_reset_password_valid_token(mocker):
-    mock_session = mocker.MagicMock()
-    mocker.patch('api.main.Session', autospec=True, return_value=mock_session)
-
+def test_reset_password_valid_token(mocker, mock_session):
     mocker.patch("api.main.modify_user_password", return_value=None)
 
     mock_token = create_mock_token(TokenStatus.ACTIVE, datetime.utcnow() + timedelta(days=1))
-    mock_session.__enter__.return_value.query.return_value.filter.return_value.first.return_value = mock_token
+    mock_session.scalar.return_value = mock_token
 
     data = {"token": "mock_token", "password": "new_password"}
     response = client.post("/reset-password/", json=data)
@@ -28,26 +30,64 @@ def test_reset_password_valid_token(mocker):
     assert response.json()["message"] == "Password reset successfully."
 
 
-def test_reset_password_invalid_token(mocker):
-    mock_session = mocker.MagicMock()
-    mocker.patch('api.main.Session', autospec=True, return_value=mock_session)
-
+def test_reset_password_invalid_token(mocker, mock_session):
     mock_token = create_mock_token(TokenStatus.EXPIRED, datetime.utcnow() - timedelta(days=1))
-    mock_session.__enter__.return_value.query.return_value.filter.return_value.first.return_value = mock_token
+    mock_session.scalar.return_value = mock_token
 
     data = {"token": "mock_token", "password": "new_password"}
     response = client.post("/reset-password/", json=data)
     assert response.status_code == 400
     assert response.json()["detail"] == "Invalid or expired token"
 
-def test_reset_password_used_token(mocker):
-    mock_session = mocker.MagicMock()
-    mocker.patch('api.main.Session', autospec=True, return_value=mock_session)
-
+def test_reset_password_used_token(mocker, mock_session):
     mock_token = create_mock_token(TokenStatus.USED, datetime.utcnow() + timedelta(days=1))
-    mock_session.__enter__.return_value.query.return_value.filter.return_value.first.return_value = mock_token
+    mock_session.scalar.return_value = mock_token
 
     data = {"token": "mock_token", "password": "new_password"}
     response = client.post("/reset-password/", json=data)
     assert response.status_code == 400
     assert response.json()["detail"] == "Invalid or expired token"
+
+
+def create_jwt(minutes):
+    expiration_time = datetime.utcnow() + timedelta(minutes=minutes)
+    return jwt.encode({"sub": "1", "exp": expiration_time}, SECRET_KEY, algorithm=ALGORITHM)
+
+def test_validate_stateless_valid_token(mocker, mock_session):
+    mocker.patch("api.main.TOKEN_VALIDATION_MODE", "stateless")
+
+    response = client.post("/validate-token/", json={"token": create_jwt(5)})
+    assert response.status_code == 200
+    assert response.json()["message"] == "Token is valid."
+    mock_session.scalar.assert_not_called()
+
+def test_validate_stateless_expired_token(mocker, mock_session):
+    mocker.patch("api.main.TOKEN_VALIDATION_MODE", "stateless")
+
+    response = client.post("/validate-token/", json={"token": create_jwt(-5)})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid or expired token"
+
+def test_validate_stateless_revoked_token(mocker, mock_session):
+    mocker.patch("api.main.TOKEN_VALIDATION_MODE", "stateless")
+    token = create_jwt(5)
+    mocker.patch("api.revocation.revocation_list", RevocationList())
+    revocation.revocation_list.add(token, time.time() + 300)
+
+    response = client.post("/validate-token/", json={"token": token})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid or expired token"
+
+
+def test_validate_token_malformed_body(mocker, mock_session):
+    for body in ({}, {"token": 1}, ["mock_token"]):
+        response = client.post("/validate-token/", json=body)
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "token"]
+    response = client.post("/validate-token/", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+def test_validate_token_body_documented():
+    schema = client.get("/openapi.json").json()
+    body = schema["paths"]["/validate-token/"]["post"]["requestBody"]
+    assert body["content"]["application/json"]["schema"]["required"] == ["token"]
@@ -0,0 +1,45 @@
+import asyncio
+
+from api import warmup
+from api.main import app
+from api.warmup import Readiness, WARMUP_QUERIES, readiness, run_warmup, warm_up
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def create_mock_engine(mocker):
+    engine = mocker.MagicMock()
+    conn = mocker.AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = conn
+    return engine, conn
+
+def test_warm_up_opens_connections_and_primes_queries(mocker):
+    engine, conn = create_mock_engine(mocker)
+
+    steps = asyncio.run(warm_up(engine, connections=3))
+    assert set(steps) == {"db_connections", "password_hash", "jwt"}
+    assert engine.connect.call_count == 3
+    assert conn.execute.await_count == 3 * (1 + len(WARMUP_QUERIES))
+
+def test_run_warmup_retries_until_ready(mocker):
+    mocker.patch("api.warmup.readiness", Readiness())
+    warm_up = mocker.patch("api.warmup.warm_up", side_effect=[ConnectionError("db down"), {"jwt": 0.001}])
+
+    asyncio.run(run_warmup(mocker.MagicMock(), retry_interval=0))
+    assert warm_up.await_count == 2
+    assert warmup.readiness.ready
+    assert warmup.readiness.status()["warmup_ms"] == {"jwt": 1.0}
+
+def test_healthz_not_ready(mocker):
+    mocker.patch.object(readiness, "ready", False)
+    response = client.get("/healthz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+def test_healthz_ready(mocker):
+    mocker.patch.object(readiness, "ready", True)
+    mocker.patch.object(readiness, "cold_start_seconds", 1.5)
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json()["cold_start_ms"] == 1500.0
@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.exceptions import OverloadedError
+from api.workers import BoundedExecutor
+
+
+def test_bounded_executor_runs_callable():
+    executor = BoundedExecutor(max_workers=1, queue_size=0)
+    result = asyncio.run(executor.run(lambda a, b=0: a + b, 1, b=2))
+    executor.shutdown()
+    assert result == 3
+    assert executor.pending == 0
+
+
+def test_bounded_executor_rejects_when_full():
+    executor = BoundedExecutor(max_workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    assert executor.pending == 0
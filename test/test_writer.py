@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from login_db.enums import TokenStatus, TokenType
+from login_db.models import Token
+from api.exceptions import OverloadedError
+from api.models import RefreshToken
+from api.writer import TokenWriter
+
+
+def create_token_row(token):
+    return {"user_id": 1,
+            "token": token,
+            "type": TokenType.ACCESS,
+            "status": TokenStatus.ACTIVE,
+            "expiration_time": datetime.utcnow() + timedelta(minutes=5)}
+
+def create_writer(mocker, **kwargs):
+    session = mocker.AsyncMock()
+    session_factory = mocker.MagicMock()
+    session_factory.return_value.__aenter__.return_value = session
+    options = {"batch_size": 100, "interval": 1, "max_buffered": 100}
+    options.update(kwargs)
+    return TokenWriter(session_factory, **options), session
+
+def test_writer_coalesces_into_one_commit(mocker):
+    writer, session = create_writer(mocker)
+    writer.insert(create_token_row("a"))
+    writer.insert(create_token_row("b"))
+    writer.update_status("b", TokenStatus.LOGGED_OUT)
+    writer.update_status("c", TokenStatus.LOGGED_OUT)
+    assert writer.is_pending("a") and writer.is_pending("c")
+
+    asyncio.run(writer.flush())
+
+    # One multi-row INSERT, one UPDATE for the single target status
+    assert session.execute.await_count == 2
+    rows = session.execute.await_args_list[0].args[1]
+    assert [row["status"] for row in rows] == [TokenStatus.ACTIVE, TokenStatus.LOGGED_OUT]
+    session.commit.assert_awaited_once()
+    assert not writer.is_pending("a")
+    assert len(writer) == 0
+
+def test_writer_batches_other_models(mocker):
+    writer, session = create_writer(mocker)
+    writer.insert(create_token_row("a"))
+    writer.insert({"token_hash": "h", "user_id": 1}, model=RefreshToken, key="h")
+    assert writer.is_pending("h")
+
+    asyncio.run(writer.flush())
+    tables = [str(call.args[0]).split()[2] for call in session.execute.call_args_list]
+    assert sorted(tables) == sorted(["refresh_tokens", Token.__tablename__])
+    assert session.commit.await_count == 1
+
+def test_writer_requeues_failed_batch(mocker):
+    writer, session = create_writer(mocker)
+    session.commit.side_effect = Exception("db down")
+    writer.insert(create_token_row("a"))
+
+    with pytest.raises(Exception):
+        asyncio.run(writer.flush())
+    assert writer.is_pending("a")
+
+def test_writer_drops_row_that_always_fails(mocker):
+    writer, session = create_writer(mocker)
+    written = []
+
+    async def execute(statement, rows=None):
+        if rows is None:
+            return
+        if any(row["token"] == "bad" for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+        written.extend(row["token"] for row in rows)
+    session.execute.side_effect = execute
+    for token in ("a", "bad", "b"):
+        writer.insert(create_token_row(token))
+
+    asyncio.run(writer.flush())
+    assert written == ["a", "b"]
+    assert writer.dropped == 1
+    assert len(writer) == 0
+
+def test_writer_drops_row_after_max_retries(mocker):
+    writer, session = create_writer(mocker, max_retries=2)
+    session.commit.side_effect = Exception("db down")
+    writer.insert(create_token_row("a"))
+
+    with pytest.raises(Exception):
+        asyncio.run(writer.flush())
+    assert writer.is_pending("a")
+    asyncio.run(writer.flush())
+    assert not writer.is_pending("a")
+    assert writer.dropped == 1
+
+def test_writer_stop_survives_failed_flush(mocker):
+    writer, session = create_writer(mocker)
+    session.commit.side_effect = Exception("db down")
+    writer.insert(create_token_row("a"))
+    asyncio.run(writer.stop())
+
+def test_writer_rejects_when_full(mocker):
+    writer, _ = create_writer(mocker, max_buffered=1)
+    writer.insert(create_token_row("a"))
+    with pytest.raises(OverloadedError):
+        writer.insert(create_token_row("b"))